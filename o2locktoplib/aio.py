@@ -0,0 +1,470 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The asyncio collection engine of o2locktop.
+All the nodes of a lockspace are collected concurrently in one event loop,
+the remote nodes are read through asyncio subprocesses. The samples are parsed
+in an executor while they are read, its threads are bounded by the CPU count
+instead of the number of nodes. This module is python3 only.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import queue
+import subprocess
+import time
+from o2locktoplib import cat
+from o2locktoplib import config
+from o2locktoplib import util
+
+
+def close_transport(process):
+    """
+    asyncio.subprocess.Process does not close its transport, an unclosed one is
+    closed by the garbage collector, maybe after the event loop was closed
+    """
+    transport = getattr(process, "_transport", None)
+    if transport is not None:
+        transport.close()
+
+class LineFeed(object):
+    """
+    The lines of one snapshot that the event loop reads from a channel, they are
+    parsed in the executor while the rest of the snapshot is still on the way.
+    The lines are handed over in chunks, so the queue is not paid for every line.
+    At most MAX_CHUNKS chunks wait for the parse, the reader awaits drain() when
+    append() returns True, so a fast channel does not pile the snapshot up in memory
+    """
+    CHUNK = 1024
+    MAX_CHUNKS = 8
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._chunk = []
+        self._count = 0
+        self._error = None
+        # the parse does not take chunks anymore
+        self._done = False
+        # created by the first drain(), in the event loop
+        self._loop = None
+        self._room = None
+
+    def append(self, line):
+        """
+        Add a line of the snapshot, it is called by the event loop.
+        Return True if the queue is full and the caller should await drain()
+        """
+        if self._done:
+            return False
+        self._chunk.append(line)
+        self._count += 1
+        if len(self._chunk) >= LineFeed.CHUNK:
+            self._queue.put(self._chunk)
+            self._chunk = []
+            return self._queue.qsize() >= LineFeed.MAX_CHUNKS
+        return False
+
+    async def drain(self):
+        """
+        Wait until the parse takes a chunk from the full queue
+        """
+        if self._room is None:
+            self._loop = asyncio.get_event_loop()
+            self._room = asyncio.Event()
+        while not self._done and self._queue.qsize() >= LineFeed.MAX_CHUNKS:
+            self._room.clear()
+            await self._room.wait()
+
+    def parse_done(self, _future=None):
+        """
+        The parse stopped, e.g. it failed, the reader must not wait for it.
+        It is the done callback of the parse, it runs in the event loop
+        """
+        self._done = True
+        if self._room is not None:
+            self._room.set()
+
+    def close(self, error=None):
+        """
+        The snapshot is complete, or it failed with error and the lines that
+        are not parsed yet are dropped
+        """
+        self._error = error
+        if error is None and self._chunk:
+            self._queue.put(self._chunk)
+        self._chunk = []
+        self._queue.put(None)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        """
+        Yield the lines until the snapshot is complete, it runs in the executor.
+        An incomplete snapshot raises IOError, so it is not processed as a whole one
+        """
+        while True:
+            chunk = self._queue.get()
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._room.set)
+            if self._error is not None:
+                raise IOError("the snapshot is incomplete: {0!r}".format(self._error))
+            if chunk is None:
+                return
+            for line in chunk:
+                yield line
+
+class AsyncCat(object):
+    """
+    The asyncio version of a Cat, it runs the get() of the wrapped Cat in the
+    executor, it is used by the local node
+    """
+    def __init__(self, cat_obj):
+        self._cat = cat_obj
+
+    async def get(self):
+        """
+        Get the locking_state of the node
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: list(self._cat.get()))
+
+    async def collect(self, node):
+        """
+        Collect one sample of the node and process it in the executor, so the parse
+        does not block the event loop. The lines of the wrapped Cat are parsed while
+        the file is being read. Return False if nothing was processed
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None,
+                                          lambda: node.process_all_slots(self._cat.get()))
+
+    async def stream(self, node):
+        """
+        Collect one sample of the node through get(), its lines are fed to the
+        executor that processes them while the rest of the reply is read.
+        Return False if nothing was processed
+        """
+        feed = LineFeed()
+        loop = asyncio.get_event_loop()
+        parse = loop.run_in_executor(None, node.process_all_slots, feed)
+        parse.add_done_callback(feed.parse_done)
+        try:
+            await self.get(feed)
+        except BaseException as expt:
+            # the parse must stop before the next sample of the node can start
+            feed.close(expt)
+            await asyncio.wait([parse])
+            if not parse.cancelled():
+                # the parse fails because of expt, expt is raised instead
+                parse.exception()
+            raise
+        feed.close()
+        return await parse
+
+    def close(self):
+        """
+        Release the resources of the cat
+        """
+        pass
+
+class AsyncSshCat(AsyncCat):
+    """
+    The asyncio version of SshCat, it runs one ssh + cat per interval
+    """
+    async def get(self, lines=None):
+        """
+        Run the ssh command and append the lines of its output to lines
+        """
+        if lines is None:
+            lines = []
+        process = await asyncio.create_subprocess_shell(self._cat.command(),
+                                                        stdout=subprocess.PIPE,
+                                                        stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                self._cat.bytes_on_wire += len(line)
+                self._cat.bytes_decoded += len(line)
+                line = line.decode("utf-8").rstrip("\n")
+                if line and lines.append(line):
+                    await lines.drain()
+            await process.wait()
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+            raise
+        finally:
+            close_transport(process)
+        return lines
+
+    async def collect(self, node):
+        """
+        Collect one sample of the node, its lines are parsed while they arrive
+        """
+        return await self.stream(node)
+
+class AsyncSshStreamCat(AsyncCat):
+    """
+    The asyncio version of SshStreamCat, it keeps one ssh channel open to the node
+    """
+    def __init__(self, cat_obj):
+        super().__init__(cat_obj)
+        self._process = None
+
+    async def _connect(self):
+        """
+        Open the long-lived ssh channel to the node
+        """
+        self._process = await asyncio.create_subprocess_exec(*self._cat.command(),
+                                                             stdin=subprocess.PIPE,
+                                                             stdout=subprocess.PIPE,
+                                                             stderr=subprocess.DEVNULL)
+        if config.DEBUG:
+            util.eprint("[DEBUG] ssh channel to {0} opened, pid={1}"
+                        .format(self._cat.node_name, self._process.pid))
+
+    def is_connected(self):
+        """
+        Check if the ssh channel is alive
+        """
+        return self._process is not None and self._process.returncode is None
+
+    def close(self):
+        """
+        Tear down the ssh channel, the next get() will reconnect
+        """
+        if self._process is None:
+            return
+        if self._process.returncode is None:
+            try:
+                self._process.kill()
+            except ProcessLookupError:
+                pass
+        close_transport(self._process)
+        self._process = None
+
+    async def _readline(self):
+        """
+        Read one line from the channel, raise IOError if the channel is closed
+        """
+        line = await self._process.stdout.readline()
+        if not line:
+            raise IOError("ssh channel to {0} is closed".format(self._cat.node_name))
+        if self._cat.UNIVERSAL_NEWLINES:
+            line = line.decode("utf-8")
+        return self._cat.decode_line(line)
+
+    async def _read_reply(self, lines):
+        """
+        Read the lines of one snapshot until the end marker and append them to lines
+        """
+        while True:
+            line = await self._readline()
+            if line == cat.SshStreamCat.END_MARKER:
+                return lines
+            if line and lines.append(line):
+                await lines.drain()
+
+    async def _fetch(self, lines):
+        """
+        Ask the remote side for one snapshot and read it
+        """
+        if not self.is_connected():
+            self.close()
+            await self._connect()
+        self._process.stdin.write(b"\n")
+        await self._process.stdin.drain()
+        return await self._read_reply(lines)
+
+    async def get(self, lines=None):
+        """
+        Get the locking_state through the ssh channel, reconnect if it is broken.
+        The lines are appended to lines, e.g. a LineFeed that is parsed meanwhile,
+        so the reply is only retried if none of its lines was appended.
+        If the collection is cancelled in the middle of a reply, the channel is
+        dropped, because the rest of the reply would confuse the next get()
+        """
+        if lines is None:
+            lines = []
+        for _ in range(config.RECONNECT_TIMES):
+            try:
+                return await self._fetch(lines)
+            except (IOError, OSError, EOFError) as expt:
+                self.close()
+                if config.DEBUG:
+                    util.eprint("[DEBUG] ssh channel to {0} failed: {1}"
+                                .format(self._cat.node_name, expt))
+                if lines:
+                    raise
+            except asyncio.CancelledError:
+                self.close()
+                raise
+        return lines
+
+    async def collect(self, node):
+        """
+        Collect one sample of the node, its lines are parsed while they arrive
+        """
+        return await self.stream(node)
+
+class AsyncSshAgentCat(AsyncSshStreamCat):
+    """
+    The asyncio version of SshAgentCat, the replies are decoded by the wrapped SshAgentCat
+    """
+    async def _connect(self):
+        """
+        Open the ssh channel and read the codec that the agent chose
+        """
+        await super()._connect()
+        self._cat.set_codec(await self._readline())
+
+    async def _read_reply(self, lines):
+        """
+        Read the header and the payload of one snapshot, and decode the payload.
+        The payload is decoded as a whole, so it is returned instead of appended to lines
+        """
+        kind, length = self._cat.parse_header(await self._readline())
+        payload = await self._process.stdout.readexactly(length)
+        return self._cat.decode_payload(kind, payload)
+
+    async def collect(self, node):
+        """
+        Collect one sample of the node and process it in the executor,
+        return False if nothing was processed
+        """
+        raw_slot_strs = await self.get()
+        if node.is_empty_cat(raw_slot_strs):
+            return False
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, node.process_all_slots, raw_slot_strs)
+
+def gen_async_cat(cat_obj):
+    """According the type of cat_obj to generate the asyncio version of it
+    Parameters:
+        cat_obj(Cat): The Cat object of a node
+    """
+    if isinstance(cat_obj, cat.SshAgentCat):
+        return AsyncSshAgentCat(cat_obj)
+    elif isinstance(cat_obj, cat.SshStreamCat):
+        return AsyncSshStreamCat(cat_obj)
+    elif isinstance(cat_obj, cat.SshCat):
+        return AsyncSshCat(cat_obj)
+    return AsyncCat(cat_obj)
+
+class AsyncEngine(object):
+    """
+    Collect all the nodes of a LockSpace concurrently in one event loop,
+    and report the LockSpace after all the nodes are collected
+    """
+    def __init__(self, lock_space):
+        self._lock_space = lock_space
+        self._cats = {}
+        # node name : the running collection task of the node
+        self._tasks = {}
+
+    def _async_cat(self, node):
+        """
+        Return the AsyncCat of the node, it is created once and reused
+        """
+        if node not in self._cats:
+            self._cats[node] = gen_async_cat(node.cat)
+        return self._cats[node]
+
+    async def collect_node(self, node, tick=None):
+        """
+        Collect one node for the tick, the locking_state is processed in the executor
+        as soon as it arrives, so the event loop keeps serving the other nodes
+        """
+        node.capture_start = time.time()
+        node.sample_tick = tick
+        processed = False
+        try:
+            processed = await self._async_cat(node).collect(node)
+        except asyncio.CancelledError:
+            raise
+        except Exception as expt:
+            if config.DEBUG:
+                util.eprint("[DEBUG] collecting node {0} failed: {1!r}".format(node.name, expt))
+        if not processed:
+            # the node is unreachable or got nothing, its last sample is stale
+            node.fail_capture()
+            return
+        if config.DEBUG:
+            print("[DEBUG] node {0} is collected in {1}s"
+                  .format(node.name, time.time() - node.capture_start))
+        node.finish_capture()
+
+    def cancel(self, node_name):
+        """
+        Cancel the running collection of one node, the other nodes are not affected
+        """
+        task = self._tasks.get(node_name)
+        if task is not None and not task.done():
+            task.cancel()
+
+    async def collect_once(self, tick=None):
+        """
+        Collect all the due nodes concurrently, and wait until all of them are
+        finished or the deadline of the tick passed. The collection of a late node
+        keeps running and is merged into the next tick
+        """
+        lock_space = self._lock_space
+        nodes = lock_space.node_list if tick is None else lock_space.due_nodes(tick)
+        for node in nodes:
+            task = self._tasks.get(node.name)
+            if task is not None and not task.done():
+                continue
+            self._tasks[node.name] = asyncio.ensure_future(self.collect_node(node, tick))
+        pending = [task for task in self._tasks.values() if not task.done()]
+        if not pending:
+            return
+        timeout = None
+        if tick is not None:
+            timeout = max(0, tick + lock_space.deadline() - time.time())
+        await asyncio.wait(pending, timeout=timeout)
+        late_nodes = [node for node in lock_space.node_list
+                      if node.name in self._tasks and not self._tasks[node.name].done()
+                      and lock_space.is_late(node)]
+        for node in lock_space.mark_stale(late_nodes):
+            self.cancel(node.name)
+
+    async def _run(self, printer_queue, interval):
+        """
+        The main loop of the engine
+        """
+        lock_space = self._lock_space
+        sched = lock_space.scheduler
+        sched.interval = interval
+        try:
+            while not lock_space.should_stop:
+                tick, delay = sched.delay(lock_space.tick_interval())
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                sched.begin(tick)
+                await self.collect_once(tick)
+                lock_space.finish_tick(printer_queue)
+        finally:
+            for async_cat in self._cats.values():
+                async_cat.close()
+
+    def run(self, printer_queue, interval):
+        """
+        Run the engine in a new event loop until the lockspace is stopped
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        # every node parses its sample in the executor while the sample is read,
+        # the parse is CPU bound, but it also waits for the lines of a slow node,
+        # so the executor has a few threads more than the CPUs as the default one.
+        # The parse of a node that does not get a thread yet only holds back the
+        # reader of that node, its LineFeed is bounded
+        loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(self._lock_space.node_list), (os.cpu_count() or 1) + 4)))
+        try:
+            loop.run_until_complete(self._run(printer_queue, interval))
+        finally:
+            loop.close()
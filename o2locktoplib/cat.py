@@ -5,7 +5,100 @@ The library of o2locktop. The main fuction of this module is
 cat the file from remote node or local file.
 """
 
+import base64
+import io
+import os
+import subprocess
+import zlib
+try:
+    import lzma
+except ImportError:
+    # python2 does not have lzma
+    lzma = None
 from o2locktoplib import util
+from o2locktoplib import config
+from o2locktoplib.retry import retry
+
+# The prefix of the line that reports a lockres disappeared since the previous
+# snapshot, it is only used by the delta collector
+TOMBSTONE = "-"
+
+# The agent that SshAgentCat pushes to the remote node. It keeps the previous
+# snapshot on the node and only sends the lines that changed, the lockres that
+# are waiting for a lock are always sent because their hang time keeps growing.
+# The codec is negotiated once: the agent picks the first codec of the comma
+# separated list in argv[2] that it can import, and announces it in the first line.
+# Every reply is a "=full <length>" or "=delta <length>" line followed by the
+# (compressed) payload.
+AGENT_SOURCE = r"""
+import sys
+path, codecs = sys.argv[1], sys.argv[2].split(",")
+codec, compress = "none", None
+for name in codecs:
+    try:
+        if name == "zlib":
+            import zlib
+            compress = lambda data: zlib.compress(data, 1)
+        elif name == "lzma":
+            import lzma
+            compress = lambda data: lzma.compress(data, preset=0)
+        else:
+            continue
+    except ImportError:
+        continue
+    codec = name
+    break
+out = getattr(sys.stdout, "buffer", sys.stdout)
+out.write(("=codec " + codec + "\n").encode("ascii"))
+out.flush()
+prev = None
+while sys.stdin.readline():
+    cur = {}
+    try:
+        filp = open(path)
+        try:
+            for line in filp:
+                tokens = line.split(None, 2)
+                if len(tokens) > 1:
+                    cur[tokens[1]] = line.rstrip("\n")
+        finally:
+            filp.close()
+    except (IOError, OSError):
+        pass
+    if prev is None:
+        kind, lines = "full", list(cur.values())
+    else:
+        kind, lines = "delta", []
+        for name, line in cur.items():
+            if prev.get(name) != line or \
+               (line.startswith("0x4") and line.rsplit(None, 1)[-1] != "0"):
+                lines.append(line)
+        for name in prev:
+            if name not in cur:
+                lines.append("-" + name)
+    payload = "\n".join(lines).encode("utf-8")
+    if compress:
+        payload = compress(payload)
+    out.write(("=%s %d\n" % (kind, len(payload))).encode("ascii"))
+    out.write(payload)
+    out.flush()
+    prev = cur
+"""
+
+DECOMPRESS = {
+    "none": lambda payload: payload,
+    "zlib": zlib.decompress,
+}
+if lzma is not None:
+    DECOMPRESS["lzma"] = lzma.decompress
+
+class DeltaSnapshot(list):
+    """
+    The lines of the lockres that changed since the previous snapshot, plus the
+    TOMBSTONE lines of the lockres that disappeared. The lockres that are not
+    in the list are byte-identical to the previous snapshot.
+    """
+    pass
 
 class Cat(object):
     """
@@ -13,6 +106,10 @@ class Cat(object):
     """
     def __init__(self, lock_space):
         self._lock_space = lock_space
+        # the bytes received from the node and the bytes after decoding them
+        self.bytes_on_wire = 0
+        self.bytes_decoded = 0
+        self.codec = None
 
     def get(self):
         """
@@ -22,9 +119,14 @@ class Cat(object):
 
 class LocalCat(Cat):
     """
-    The local mode class of Cat
+    The local mode class of Cat, it reads the debugfs file directly,
+    without forking a shell and cat in every interval
     """
+    CHUNK_SIZE = 1024 * 1024
+
     def  __init__(self, lock_space):
+        # the read buffers are reused by the following get()
+        self._buffers = []
         if util.PY2:
             super(LocalCat, self).__init__(lock_space)
         else:
@@ -33,9 +135,49 @@ class LocalCat(Cat):
 
     def get(self):
         """
-        According  the lock_sapce to get the local node's locking_state
+        According  the lock_sapce to get the local node's locking_state,
+        the lines are returned by a generator while the file is being read
         """
-        return util.get_one_cat(self._lock_space, None)
+        path = util.locking_state_path(self._lock_space)
+        try:
+            filp = io.open(path, "rb", buffering=0)
+        except (IOError, OSError) as expt:
+            if config.DEBUG:
+                util.eprint("[DEBUG] open {0} failed: {1}".format(path, expt))
+            return []
+        return self._iter_lines(filp)
+
+    def _iter_lines(self, filp):
+        """
+        Read the file in large chunks into a reused bytearray,
+        and yield the non-empty lines one by one
+        """
+        buf = self._buffers.pop() if self._buffers else bytearray(LocalCat.CHUNK_SIZE)
+        filled = 0
+        try:
+            while True:
+                if filled == len(buf):
+                    # a line is longer than the buffer
+                    buf.extend(bytearray(len(buf)))
+                size = filp.readinto(memoryview(buf)[filled:])
+                if not size:
+                    break
+                end = filled + size
+                start = 0
+                while True:
+                    newline = buf.find(b"\n", start, end)
+                    if newline < 0:
+                        break
+                    if newline > start:
+                        yield buf[start:newline].decode("utf-8")
+                    start = newline + 1
+                filled = end - start
+                buf[:filled] = buf[start:end]
+            if filled:
+                yield buf[:filled].decode("utf-8")
+        finally:
+            filp.close()
+            self._buffers.append(buf)
 
 class SshCat(Cat):
     """
@@ -48,19 +190,356 @@ class SshCat(Cat):
         else:
             super().__init__(lock_space)
 
+    @property
+    def node_name(self):
+        """
+        Return the name of the node that this cat reads from
+        """
+        return self._node_name
+
+    def command(self):
+        """
+        Return the shell command that cats the locking_state of the node
+        """
+        return util.get_one_cat_cmd(self._lock_space, self._node_name)
+
+    def get(self):
+        """
+        According  the lock_sapce to get the remote node's locking_state,
+        the lines are yielded as they arrive from the ssh pipe
+        """
+        for line in util.iter_one_cat(self._lock_space, self._node_name):
+            # iter_one_cat strips the newline of the line
+            self.bytes_on_wire += len(line) + 1
+            self.bytes_decoded += len(line) + 1
+            yield line
+
+class SshStreamCat(Cat):
+    """
+    The remote mode class of Cat that keeps one ssh channel open to the node.
+    A shell loop on the remote side dumps the locking_state every time a new
+    line is written to the channel, so each get() costs one round-trip instead
+    of a new ssh handshake.
+    """
+    END_MARKER = "__O2LOCKTOP_END__"
+    UNIVERSAL_NEWLINES = True
+
+    def __init__(self, lock_space, node_name):
+        self._node_name = node_name
+        self._process = None
+        # a request was sent and its reply was not read to the end
+        self._pending = False
+        if util.PY2:
+            super(SshStreamCat, self).__init__(lock_space)
+        else:
+            super().__init__(lock_space)
+
+    def _remote_script(self):
+        """
+        The shell loop that runs on the remote node
+        """
+        return "while read _; do cat {path}; echo {marker}; done".format(
+            path=util.locking_state_path(self._lock_space),
+            marker=SshStreamCat.END_MARKER)
+
+    @property
+    def node_name(self):
+        """
+        Return the name of the node that this cat reads from
+        """
+        return self._node_name
+
+    def command(self):
+        """
+        Return the argument list of the ssh channel
+        """
+        return ["ssh", "-T", "-oBatchMode=yes"] + util.ssh_options() + \
+               ["root@{0}".format(self._node_name), self._remote_script()]
+
+    def _connect(self):
+        """
+        Open the long-lived ssh channel to the node, the stderr is dropped,
+        because nobody reads it and a full pipe would block the remote side
+        """
+        with open(os.devnull, "w") as devnull:
+            self._process = subprocess.Popen(
+                self.command(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=devnull,
+                universal_newlines=self.UNIVERSAL_NEWLINES)
+        if config.DEBUG:
+            util.eprint("[DEBUG] ssh channel to {0} opened, pid={1}"
+                        .format(self._node_name, self._process.pid))
+
+    def is_connected(self):
+        """
+        Check if the ssh channel is alive
+        """
+        process = self._process
+        return process is not None and process.poll() is None
+
+    def close(self):
+        """
+        Tear down the ssh channel, the next get() will reconnect.
+        A reader blocked on the channel in another thread gets an IOError
+        """
+        process, self._process = self._process, None
+        self._pending = False
+        if process is None:
+            return
+        try:
+            process.kill()
+            process.wait()
+        except OSError:
+            pass
+
+    def _channel(self):
+        """
+        Return the process of the ssh channel, raise IOError if it was closed,
+        e.g. by another thread while this one was waiting for the reply
+        """
+        process = self._process
+        if process is None:
+            raise IOError("ssh channel to {0} is closed".format(self._node_name))
+        return process
+
+    @retry(config.RECONNECT_TIMES, exceptions=(IOError, OSError))
+    def _fetch(self):
+        """
+        Ask the remote loop for one snapshot and start reading the reply,
+        if the channel is broken, close it and let the retry reconnect.
+        The reply is read until its first line here, so a channel that breaks
+        before the reply arrives is retried too
+        """
+        try:
+            if self._pending:
+                # the last reply was abandoned, the rest of it would be read
+                # as the reply of this request
+                if config.DEBUG:
+                    util.eprint("[DEBUG] the last reply from {0} was not read to the end"
+                                .format(self._node_name))
+                self.close()
+            if not self.is_connected():
+                self.close()
+                self._connect()
+            self._send_request()
+            self._pending = True
+            return self._read_reply()
+        except (IOError, OSError):
+            self.close()
+            raise
+
+    def _send_request(self):
+        """
+        Ask the remote loop for a new snapshot
+        """
+        process = self._channel()
+        process.stdin.write("\n")
+        process.stdin.flush()
+
+    def _readline(self):
+        """
+        Read one line from the channel, raise IOError if the channel is closed
+        """
+        line = self._channel().stdout.readline()
+        if not line:
+            raise IOError("ssh channel to {0} is closed".format(self._node_name))
+        return self.decode_line(line)
+
+    def decode_line(self, line):
+        """
+        Count the line that was read from the channel and strip it
+        """
+        self.bytes_on_wire += len(line)
+        self.bytes_decoded += len(line)
+        return line.rstrip("\n")
+
+    def _read_reply(self):
+        """
+        Read the first line of one snapshot and return a generator of its lines,
+        so the lines are parsed while the rest of the snapshot is still on the way
+        """
+        line = self._readline()
+        if line == SshStreamCat.END_MARKER:
+            self._pending = False
+            return []
+        return self._iter_reply(line, self._process)
+
+    def _iter_reply(self, line, process):
+        """
+        Yield the lines of one snapshot from its first line until the end marker.
+        The reply can not be retried once some lines were yielded, so if the
+        channel breaks in the middle, or the caller stops early, the channel is
+        dropped. A broken channel raises the error to the caller, so the
+        incomplete snapshot is not taken as a whole one.
+        A reply that is never read to the end drops the channel at the next request,
+        then the rest of it can not be read from the new channel
+        """
+        finished = False
+        try:
+            while True:
+                if line == SshStreamCat.END_MARKER:
+                    finished = True
+                    self._pending = False
+                    return
+                if line:
+                    yield line
+                if self._process is not process:
+                    raise IOError("the reply from {0} was abandoned".format(self._node_name))
+                line = self._readline()
+        except (IOError, OSError) as expt:
+            if config.DEBUG:
+                util.eprint("[DEBUG] ssh channel to {0} failed: {1}"
+                            .format(self._node_name, expt))
+            raise
+        finally:
+            if not finished and self._process is process:
+                self.close()
+
     def get(self):
         """
         According  the lock_sapce to get the remote node's locking_state
+        through the persistent ssh channel
+        """
+        try:
+            return self._fetch()
+        except (IOError, OSError) as expt:
+            if config.DEBUG:
+                util.eprint("[DEBUG] ssh channel to {0} failed: {1}"
+                            .format(self._node_name, expt))
+            return []
+
+class SshAgentCat(SshStreamCat):
+    """
+    The remote mode class of Cat that pushes a small python agent through the
+    ssh channel. The first get() returns the whole locking_state, the following
+    ones return a DeltaSnapshot, so the idle lockres do not cross the network.
+    The snapshots can be compressed with the codec negotiated with the agent.
+    """
+    UNIVERSAL_NEWLINES = False
+
+    def __init__(self, lock_space, node_name, compress=None):
+        self._compress = compress if compress is not None else config.COMPRESS
+        if util.PY2:
+            super(SshAgentCat, self).__init__(lock_space, node_name)
+        else:
+            super().__init__(lock_space, node_name)
+
+    def _offered_codecs(self):
+        """
+        The codecs that this side can decode, in the order of preference
+        """
+        offered = []
+        if self._compress == "lzma" and lzma is not None:
+            offered.append("lzma")
+        if self._compress in ("lzma", "zlib"):
+            offered.append("zlib")
+        return ",".join(offered) if offered else "none"
+
+    def _remote_script(self):
+        """
+        Start the agent with the python found on the remote node
+        """
+        code = base64.b64encode(AGENT_SOURCE.encode("utf-8")).decode("ascii")
+        return "exec $(command -v python3 || command -v python) -u -c "\
+               "\"exec(__import__('base64').b64decode('{code}'))\" {path} {codecs}"\
+               .format(code=code,
+                       path=util.locking_state_path(self._lock_space),
+                       codecs=self._offered_codecs())
+
+    def _connect(self):
+        """
+        Open the ssh channel and read the codec that the agent chose
+        """
+        if util.PY2:
+            super(SshAgentCat, self)._connect()
+        else:
+            super()._connect()
+        self.set_codec(self._readline())
+
+    def set_codec(self, hello):
+        """
+        Check the first line that the agent sent and use the codec in it
+        """
+        hello = hello.split()
+        if len(hello) != 2 or hello[0] != "=codec" or hello[1] not in DECOMPRESS:
+            raise IOError("unknown hello from the agent on {0}: {1}"
+                          .format(self._node_name, " ".join(hello)))
+        self.codec = hello[1]
+
+    def _send_request(self):
+        """
+        Ask the agent for a new snapshot
+        """
+        process = self._channel()
+        process.stdin.write(b"\n")
+        process.stdin.flush()
+
+    def _readline(self):
+        """
+        Read one header line from the binary channel
+        """
+        line = self._channel().stdout.readline()
+        if not line:
+            raise IOError("ssh channel to {0} is closed".format(self._node_name))
+        return self.decode_line(line)
+
+    def decode_line(self, line):
+        """
+        Count the header line that was read from the channel and decode it
+        """
+        self.bytes_on_wire += len(line)
+        return line.decode("ascii").rstrip("\n")
+
+    def parse_header(self, header):
+        """
+        Return the kind("=full" or "=delta") and the payload length of a reply
+        """
+        header = header.split()
+        if len(header) != 2 or header[0] not in ("=full", "=delta"):
+            raise IOError("unknown reply from the agent on {0}: {1}"
+                          .format(self._node_name, " ".join(header)))
+        return header[0], int(header[1])
+
+    def decode_payload(self, kind, payload):
+        """
+        Decompress the payload of a reply and split it to lines
+        """
+        self.bytes_on_wire += len(payload)
+        try:
+            payload = DECOMPRESS[self.codec](payload).decode("utf-8")
+        except Exception as expt:
+            raise IOError("broken reply from the agent on {0}: {1}"
+                          .format(self._node_name, expt))
+        self.bytes_decoded += len(payload)
+        lines = [i for i in payload.split("\n") if i]
+        if kind == "=delta":
+            return DeltaSnapshot(lines)
+        return lines
+
+    def _read_reply(self):
+        """
+        Read the header and the payload of one snapshot, and decode the payload
         """
-        return util.get_one_cat(self._lock_space, self._node_name)
+        kind, length = self.parse_header(self._readline())
+        payload = self._channel().stdout.read(length)
+        if len(payload) != length:
+            raise IOError("ssh channel to {0} is closed".format(self._node_name))
+        self._pending = False
+        return self.decode_payload(kind, payload)
 
 def gen_cat(which, lock_space, *args):
     """According 'which' parameter to generate different Cat object
     Parameters:
-        which(str): The mode of Cat, it can be 'local' or 'ssh'
+        which(str): The mode of Cat, it can be 'local', 'ssh', 'stream' or 'delta'
     """
     if which == 'local':
         return LocalCat(lock_space)
     elif which == 'ssh':
         return SshCat(lock_space, *args)
+    elif which == 'stream':
+        return SshStreamCat(lock_space, *args)
+    elif which == 'delta':
+        return SshAgentCat(lock_space, *args)
     return None
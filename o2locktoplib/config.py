@@ -13,6 +13,44 @@ if DEBUG:
 else:
     CLEAR = True
 INTERVAL = 5
+# tune the interval of every node between MIN_INTERVAL and MAX_INTERVAL according to
+# the cost of the collection and the number of the changed lockres on the node
+ADAPTIVE = False
+MIN_INTERVAL = 2
+MAX_INTERVAL = 30
+# how to collect locking_state from the remote nodes, it can be
+# 'ssh'(one ssh + cat per interval), 'stream'(one ssh channel per node)
+# or 'delta'(a python agent on the node only sends the changed lines)
+COLLECTOR = "stream"
+RECONNECT_TIMES = 3
+# share one multiplexed ssh control connection per node between all the ssh commands
+SSH_MULTIPLEX = True
+# the seconds after a tick that the report waits for the nodes, 0 means 80% of the
+# interval, a node that misses it is reported with its last data marked stale
+DEADLINE = 0
+# drop the collector of a node that has been stale for so many ticks, so a hung
+# ssh session is reconnected
+STALE_RESET = 3
+# the engine that drives the collection, it can be 'thread'(one thread per node)
+# or 'asyncio'(all the nodes in one event loop, python3 only)
+ENGINE = "thread"
+# the compression of the 'delta' collector, it can be 'none', 'zlib' or 'lzma'
+COMPRESS = "none"
+# the lock types to track, e.g. set(["M", "W"]), None means all the types.
+# The lines of the other types are dropped before they are parsed
+LOCK_TYPES = None
+# rank the locks by the delta over the last WINDOW seconds instead of the last interval,
+# 0 means the last interval. Every lock keeps the counters of its last HISTORY samples
+WINDOW = 0
+HISTORY = 0
+# stop tracking the lockres that have not been acquired for IDLE_TTL seconds, and the
+# coldest lockres when more than MAX_LOCKS are tracked on a node, 0 means no limit.
+# An evicted lockres is tracked again once it changes
+IDLE_TTL = 0
+MAX_LOCKS = 0
+# the number of the lock sets with the biggest key index that are kept for the ranking
+# of every report, the top n shown are taken from them
+RANK_LIMIT = 600
 pr_locks = 0
 ex_locks = 0
 UUID = ""
@@ -11,9 +11,12 @@ import time
 import os
 import decimal
 import math
+import array
+import heapq
 from o2locktoplib import util
 from o2locktoplib import config
 from o2locktoplib import cat
+from o2locktoplib import scheduler
 
 # cat  -----  output of one time execution of "cat locking_stat"
                 # one cat contains multiple Shot(es)
@@ -27,49 +30,104 @@ _DEBUG = False
 
 LOCK_LEVEL_PR = 0
 LOCK_LEVEL_EX = 1
-KEEP_HISTORY_CNT = 2
+# appended to the name of a node whose data missed the deadline
+STALE_MARKER = "*"
+# the typecode of the 64 bits integer columns of a LockTable
+_INT_ARRAY = "l" if util.PY2 else "q"
 
 
-class LockName:
+class LockNameCache(object):
     """
-    The Lock format is as follows
-    M    000000 0000000000000005        6434f530
-    type  PAD   blockno(hex)            generation(hex)
-    [0:1][1:1+6][1+6:1+6+16]            [1+6+16:]
-    not for dentry
+    The decoded lock names of a node, the lock type, the inode number, the generation
+    and the short name of a lock name are computed once and shared by every LockName
+    of this name in the snapshots of the node.
+    An entry is evicted when the node stops tracking its lockres, so the cache only
+    holds the lockres that the node tracks
     """
+    # the index of the decoded fields in an entry
+    LOCK_TYPE, INODE_NUM, GENERATION, SHORT_NAME = range(4)
+
+    def __init__(self):
+        self._entries = {}
+        self.evicted = 0
+
+    @staticmethod
+    def decode(lock_name):
+        """
+        The Lock format is as follows
+        M    000000 0000000000000005        6434f530
+        type  PAD   blockno(hex)            generation(hex)
+        [0:1][1:1+6][1+6:1+6+16]            [1+6+16:]
+        If the lock type is 'N', use the short inode format(dentry lock),
+        else use the normal inode format.(You can refer ocfs2 source code)
+        """
+        lock_type = lock_name[0]
+        if lock_type != "N":
+            inode_num = int(lock_name[7 : 7+16], 16)
+        else:
+            inode_num = int(lock_name[-8:], 16)
+        if util.PY2:
+            short_name = "{0:4} {1:12}".format(lock_type, str(inode_num))
+        else:
+            short_name = "{:4} {:12}".format(lock_type, str(inode_num))
+        return (lock_type, inode_num, lock_name[-8:], short_name)
+
+    def get(self, lock_name):
+        """
+        Return the decoded fields of the lock name, decode it if it is not cached
+        """
+        entry = self._entries.get(lock_name)
+        if entry is None:
+            entry = self.decode(lock_name)
+            self._entries[lock_name] = entry
+        return entry
+
+    def evict(self, lock_name):
+        """
+        The lockres disappeared, drop its entry
+        """
+        if self._entries.pop(lock_name, None) is not None:
+            self.evicted += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+class LockName(object):
+    """
+    The name of a lockres, the fields of the name are decoded at the first access
+    and kept with the name. A node fills them from its LockNameCache
+    """
+    __slots__ = ("_name", "_decoded")
 
     def __init__(self, lock_name):
         self._name = lock_name
+        self._decoded = None
+
+    def _get_decoded(self, field):
+        if self._decoded is None:
+            self._decoded = LockNameCache.decode(self._name)
+        return self._decoded[field]
 
     @property
     def lock_type(self):
         """
         Return the lock type of the lock, e.g M
         """
-        lock_name = self._name
-        return lock_name[0]
+        return self._get_decoded(LockNameCache.LOCK_TYPE)
 
     @property
     def inode_num(self):
         """
         Return the inode number of the lock
-        If the lock type is 'N', use the short inode format,
-        else use the normal inode format.(You can refer ocfs2 source code)
         """
-        if self._name[0] != "N":
-            start, end = 7, 7+16
-            lock_name = self._name
-            return int(lock_name[start : end], 16)
-        # dentry lock
-        return int(self._name[-8:], 16)
+        return self._get_decoded(LockNameCache.INODE_NUM)
 
     @property
     def generation(self):
         """
         Return the generation of the lock, not used in the new version
         """
-        return self._name[-8:]
+        return self._get_decoded(LockNameCache.GENERATION)
 
     @property
     def short_name(self):
@@ -77,9 +135,7 @@ class LockName:
         Return the short format of a lock, just use lock type and inode number
         to represent a lock
         """
-        if util.PY2:
-            return "{0:4} {1:12}".format(self.lock_type, str(self.inode_num))
-        return "{:4} {:12}".format(self.lock_type, str(self.inode_num))
+        return self._get_decoded(LockNameCache.SHORT_NAME)
 
     def __str__(self):
         return self._name
@@ -93,73 +149,165 @@ class LockName:
     def __hash__(self):
         return hash(self._name)
 
-class Shot:
+class DebugFormat(object):
+    """
+    The declarative schema of one debug version of the locking_state.
+    A field is (name, the number of its tokens), the fields are in the order of
+    a line. The parsers of a version are compiled from its schema
+    """
+    def __init__(self, version, fields):
+        self.version = version
+        self.fields = tuple(fields)
+        # field name : the index of its first token
+        self.index = {}
+        columns = 0
+        for name, length in self.fields:
+            self.index[name] = columns
+            columns += length
+        self.columns = columns
+        # the fields before the first multi-token field (the lvb) are split from
+        # the head of a line, the fields after it from the tail
+        self.tail_start = columns
+        for name, length in self.fields:
+            if length > 1:
+                self.tail_start = self.index[name]
+                break
+
+    def __contains__(self, name):
+        return name in self.index
+
+# debug version : DebugFormat
+DEBUG_FORMATS = {}
+
+def register_debug_format(version, fields):
+    """Describe a debug version of the locking_state, a new kernel format only needs
+    to be registered here
+    Parameters:
+        version(int): The debug version, the first token of a line
+        fields(tuple): The (name, the number of tokens) of every field in a line
+    """
+    DEBUG_FORMATS[version] = DebugFormat(version, fields)
+    return DEBUG_FORMATS[version]
+
+DEBUG_FORMAT_V3 = (
+    ("debug_ver", 1),
+    ("name", 1),
+    ("l_level", 1),
+    ("l_flags", 1),
+    ("l_action", 1),
+    ("l_unlock_action", 1),
+    ("l_ro_holders", 1),
+    ("l_ex_holders", 1),
+    ("l_requested", 1),
+    ("l_blocking", 1),
+    ("lvb_64B", 64),
+    ("lock_num_prmode", 1),
+    ("lock_num_exmode", 1),
+    ("lock_num_prmode_failed", 1),
+    ("lock_num_exmode_failed", 1),
+    ("lock_total_prmode", 1), #unit ns
+    ("lock_total_exmode", 1), #unit ns
+    ("lock_max_prmode", 1), #unit ns
+    ("lock_max_exmode", 1), #unit ns
+    ("lock_refresh", 1),
+)
+
+DEBUG_FORMAT_V4 = DEBUG_FORMAT_V3 + (
+    ("lock_last_prmode", 1),
+    ("lock_last_exmode", 1),
+    ("lock_wait", 1),
+)
+
+register_debug_format(3, DEBUG_FORMAT_V3)
+register_debug_format(4, DEBUG_FORMAT_V4)
+
+class Shot(object):
     """
     The Shot class represent a complete line in the locking_stat file
-    The line includes all the information of the lock
-    Support the ocfs2 debug info version3 and version4
+    Only the fields of the projection are extracted from the line, as int,
+    by default the fields that the statistics need (Shot.STAT_FIELDS).
+    The full record, the lvb and the raw line are kept only if raw is True
+    Support the debug versions in DEBUG_FORMATS
     """
-    debug_format_v3 = (
-        ("debug_ver", 1),
-        ("name", 1),
-        ("l_level", 1),
-        ("l_flags", 1),
-        ("l_action", 1),
-        ("l_unlock_action", 1),
-        ("l_ro_holders", 1),
-        ("l_ex_holders", 1),
-        ("l_requested", 1),
-        ("l_blocking", 1),
-        ("lvb_64B", 64),
-        ("lock_num_prmode", 1),
-        ("lock_num_exmode", 1),
-        ("lock_num_prmode_failed", 1),
-        ("lock_num_exmode_failed", 1),
-        ("lock_total_prmode", 1), #unit ns
-        ("lock_total_exmode", 1), #unit ns
-        ("lock_max_prmode", 1), #unit ns
-        ("lock_max_exmode", 1), #unit ns
-        ("lock_refresh", 1),
-    )
-
-    debug_format_v4 = debug_format_v3 + (
-        ("lock_last_prmode", 1),
-        ("lock_last_exmode", 1),
-        ("lock_wait", 1),
-    )
-
-    def __init__(self, source_str):
-        self.source = source_str.strip()
-        strings = source_str.strip().split()
-        self.debug_ver = int(strings[0].lstrip("0x"))
-        assert(self.debug_ver == 3 or self.debug_ver == 4)
-        self.debug_format = Shot.debug_format_v3 if self.debug_ver == 3 else Shot.debug_format_v4
-        i = 0
-        for item in self.debug_format:
-            # key, value = item[0], item[1]
-            var_name = item[0]
-            var_len = item[1]
-            value = "".join(strings[i: i + var_len])
-            setattr(self, var_name, value)
-            i += var_len
-        self.name = LockName(self.name)
-        self.debug_ver = int(strings[0].lstrip("0x"))
-        if self.debug_ver == 4:
+    debug_format_v3 = DEBUG_FORMAT_V3
+    debug_format_v4 = DEBUG_FORMAT_V4
+
+    # the fields that Lock and LockSet use
+    STAT_FIELDS = ("name", "l_requested",
+                   "lock_num_prmode", "lock_num_exmode",
+                   "lock_total_prmode", "lock_total_exmode",
+                   "lock_refresh", "lock_wait")
+    # the numeric fields that a shot keeps, the counters are the fields after lvb_64B
+    INT_FIELDS = ("l_requested",) + tuple(i[0] for i in DEBUG_FORMAT_V4[11:])
+    # the fields that check_hang needs
+    HANG_FIELDS = ("l_requested", "lock_total_prmode", "lock_total_exmode", "lock_wait")
+
+    __slots__ = ("debug_ver", "name") + INT_FIELDS + \
+                ("lock_prmode_hang_time", "lock_exmode_hang_time", "raw")
+
+    def __init__(self, source_str, raw=False, projection=None):
+        """
+        Parameters:
+            source_str(str): A line of the locking_state
+            raw(bool): Materialize the full record of the line
+            projection(Projection or CompiledProjection): The fields to extract,
+                the compiled projection of a negotiated version skips the version detection
+        """
+        self.raw = None
+        self.lock_prmode_hang_time = 0
+        self.lock_exmode_hang_time = 0
+        if raw:
+            self._parse_all(source_str)
+        else:
+            if projection is None:
+                projection = Shot.stat_projection
+            projection.parse(self, source_str)
+
+    def _parse_all(self, source_str):
+        """
+        Materialize the full record of the line, it is used by the raw dump
+        """
+        strings = source_str.split()
+        debug_format = DEBUG_FORMATS.get(int(strings[0], 16))
+        assert debug_format is not None
+        if len(strings) < debug_format.columns:
+            raise ValueError("the line of {0} is too short".format(strings[1]))
+        self.debug_ver = debug_format.version
+        self.name = LockName(strings[1])
+        self.raw = {"source": source_str.strip()}
+        for name, length in debug_format.fields[2:]:
+            i = debug_format.index[name]
+            if name in Shot.INT_FIELDS:
+                setattr(self, name, int(strings[i]))
+            else:
+                self.raw[name] = "".join(strings[i : i+length])
+        for name in Shot.INT_FIELDS:
+            if name not in debug_format:
+                setattr(self, name, 0)
+        if "lock_wait" in debug_format:
             self.check_hang()
 
+    def __getattr__(self, name):
+        """
+        The fields that are not numeric are only available in the raw mode
+        """
+        if name != "raw" and self.raw is not None and name in self.raw:
+            return self.raw[name]
+        raise AttributeError(name)
+
     def check_hang(self):
         """
         According current timestamp to judge if the lock is hanged
         If hanged, set the lock_total_prmode and lock_total_exmode to inf
         """
-        if self.lock_wait == '0':
+        if self.lock_wait == 0:
             return
-        hang_time = int(time.time()) - int(self.lock_wait)/1000000
+        hang_time = int(time.time()) - self.lock_wait/1000000
         if hang_time > config.INTERVAL:
-            if self.l_requested == '3':
+            if self.l_requested == 3:
                 self.lock_total_prmode = float('inf')
                 self.lock_prmode_hang_time = hang_time
-            if self.l_requested == '5':
+            if self.l_requested == 5:
                 self.lock_total_exmode = float('inf')
                 self.lock_exmode_hang_time = hang_time
 
@@ -168,10 +316,10 @@ class Shot:
         Put the shot by a friendly format
         """
         ret = []
-        keys = [i[0] for i in self.debug_format]
-        for k in keys:
-            value = getattr(self, k)
-            ret.append("{0} : {1}".format(k, value))
+        for k, _ in DEBUG_FORMATS[self.debug_ver].fields:
+            value = getattr(self, k, None)
+            if value is not None:
+                ret.append("{0} : {1}".format(k, value))
         return "\n".join(ret)
 
     def legal(self):
@@ -196,14 +344,122 @@ class Shot:
         """
         return self.name.lock_type
 
+class VersionMismatch(ValueError):
+    """
+    The debug version of a line is not the version that the parser was compiled for
+    """
+    pass
+
+class Projection(object):
+    """
+    The fields that a parser extracts from a line of the locking_state.
+    The projection is compiled for every debug version, see CompiledProjection.
+    Parsing a line with the projection itself detects the version of every line,
+    a Node negotiates the version once and parses with the compiled projection
+    """
+    def __init__(self, fields):
+        unknown = [name for name in fields if name != "name" and name not in Shot.INT_FIELDS]
+        if unknown:
+            raise ValueError("can not project the fields {0}".format(", ".join(unknown)))
+        self.fields = tuple(fields)
+        # debug version : CompiledProjection
+        self._compiled = {}
+
+    def compile(self, version):
+        """
+        Return the parser of this projection for the debug version,
+        raise ValueError if the version is unknown
+        """
+        compiled = self._compiled.get(version)
+        if compiled is None:
+            if version not in DEBUG_FORMATS:
+                raise ValueError("unknown debug version {0}".format(version))
+            compiled = CompiledProjection(self, DEBUG_FORMATS[version])
+            self._compiled[version] = compiled
+        return compiled
+
+    def parse(self, shot, line):
+        """
+        Detect the debug version of the line and parse it with the compiled projection
+        """
+        self.compile(int(line.split(None, 1)[0], 16)).parse(shot, line)
+
+class CompiledProjection(object):
+    """
+    A Projection compiled for one debug version.
+    The line is split only as far as the fields need: the fields before the lvb
+    are taken from the head of the line, the counters from its tail, the 64 tokens
+    of the lvb in the middle are never split
+    """
+    def __init__(self, projection, debug_format):
+        self.version = debug_format.version
+        self.fields = projection.fields
+        # the first token of the lines of this version, e.g. 0x4
+        self._tag = "0x{0:x}".format(self.version)
+        fields = [(name, debug_format.index[name]) for name in self.fields
+                  if name != "name" and name in debug_format]
+        head = [(name, i) for name, i in fields if i < debug_format.tail_start]
+        tail = [(name, i) for name, i in fields if i >= debug_format.tail_start]
+        # the version and the name are always extracted
+        self._head_split = max([1] + [i for _, i in head]) + 1
+        self._head_fields = head
+        columns = debug_format.columns
+        self._tail_split = columns - min([columns] + [i for _, i in tail])
+        self._tail_fields = [(name, self._tail_split - (columns - 1 - i)) for name, i in tail]
+        # the fields that this version does not have
+        self._missing = [name for name in self.fields
+                         if name != "name" and name not in debug_format]
+        self.check_hang = all(name in self.fields and name in debug_format
+                              for name in Shot.HANG_FIELDS)
+
+    def parse(self, shot, line):
+        """
+        Extract the fields of the projection from the line into the shot,
+        raise VersionMismatch if the line is of another debug version,
+        ValueError or IndexError if the line is too short
+        """
+        head = line.split(None, self._head_split)
+        if head[0] != self._tag and int(head[0], 16) != self.version:
+            raise VersionMismatch("the line of {0} is not debug version {1}"
+                                  .format(head[1], self.version))
+        shot.debug_ver = self.version
+        shot.name = LockName(head[1])
+        for name, i in self._head_fields:
+            setattr(shot, name, int(head[i]))
+        if self._tail_split:
+            tail = head[-1].rsplit(None, self._tail_split)
+            if len(tail) != self._tail_split + 1:
+                raise ValueError("the line of {0} is too short".format(head[1]))
+            for name, i in self._tail_fields:
+                setattr(shot, name, int(tail[i]))
+        for name in self._missing:
+            setattr(shot, name, 0)
+        if self.check_hang:
+            shot.check_hang()
+
+Shot.stat_projection = Projection(Shot.STAT_FIELDS)
+
+def key_index_of(level_info):
+    """
+    The key index of a lock is the average of the average wait time of its lock levels,
+    level_info is the (delta_time, delta_num, average) of every lock level
+    """
+    avg_key_index = 0
+    for level in [LOCK_LEVEL_PR, LOCK_LEVEL_EX]:
+        avg_key_index += level_info[level][-1]
+    return avg_key_index/2
+
 class Lock():
     def __init__(self, node):
         self._node = node
         self._shots = [None, None]
         # In the ocfs2 debug v4, if the lock is nit fresh, we shoule delete it
         self._fresh = 1
-        self.keep_history_cnt = KEEP_HISTORY_CNT
         self.refresh_flag = False
+        # the delta time, delta num and average of every lock level, and the key index,
+        # they are computed once when a shot is appended
+        self._level_info = [(0, 0, 0), (0, 0, 0)]
+        self._key_index = 0
 
     @property
     def shot_count(self):
@@ -274,7 +530,16 @@ class Lock():
 
     def get_lock_level_info(self, lock_level, unit='ns'):
         """
-        return delta_time, delta_num and key_index
+        return delta_time, delta_num and key_index,
+        they are cached when the last shot was appended
+        """
+        if unit != 'ns':
+            return self.compute_lock_level_info(lock_level, unit)
+        return self._level_info[lock_level]
+
+    def compute_lock_level_info(self, lock_level, unit='ns'):
+        """
+        Compute delta_time, delta_num and key_index from the shots
         """
         #pdb.set_trace()
         if not self.has_delta():
@@ -294,8 +559,8 @@ class Lock():
         delta_num = self._get_latest_data_field_delta(total_num_field)
         #(total_time, total_num, key_indexn)
         if delta_time < 0 or delta_num < 0:
-            delta_time = self._get_latest_data_field_delta_abs(total_time_field)//ratio
-            delta_num = self._get_latest_data_field_delta_abs(total_num_field)
+            # the counters were reset, the lifetime total is not the delta of the interval
+            return 0, 0, 0
         if math.isnan(delta_time):
             hang_type = self._lock_level_2_hang_field(lock_level)
             hang_time = self._get_data_field_indexed(hang_type, -1)
@@ -319,6 +584,7 @@ class Lock():
         if shot == None:
             self._shots[0] = None
             self._shots[1] = None
+            self.update_info()
             return
         if not hasattr(self, "_name"):
             self._name = shot.name
@@ -336,6 +602,7 @@ class Lock():
             self._shots[0] = self._shots[1]
             self._shots[1] = shot
         self.refresh_flag = True
+        self.update_info()
 
         if not _DEBUG:
             return
@@ -352,11 +619,30 @@ class Lock():
             print("total num line")
             print(num_line)
 
+    def append_unchanged(self):
+        """
+        The lockres is the same as the last shot, append the last shot again,
+        so the delta of this interval is zero
+        """
+        shot = self._shots[1] if self._shots[1] is not None else self._shots[0]
+        if shot is None:
+            return
+        self.append(shot)
+
+    def is_changed(self):
+        """
+        Return True if the lock was acquired between the two latest shots
+        """
+        if not self.has_delta():
+            return False
+        return self._shots[0].lock_num_prmode != self._shots[1].lock_num_prmode or \
+               self._shots[0].lock_num_exmode != self._shots[1].lock_num_exmode
+
     def get_line(self, data_field, delta=False):
         """
         Get the the two latest shot according to para data_field
         """
-        data_list = [int(getattr(i, data_field)) for i in self._shots]
+        data_list = [getattr(i, data_field) for i in self._shots]
         if not delta:
             return data_list
 
@@ -369,17 +655,18 @@ class Lock():
 
     def get_key_index(self):
         """
-        We will accoring the return of this function to sort all the lock
+        We will accoring the return of this function to sort all the lock,
+        it is cached when the last shot was appended
         """
-        if not self.has_delta():
-            return 0
-        avg_key_index = 0
-        for level in [LOCK_LEVEL_PR, LOCK_LEVEL_EX]:
-            # could use unit='us' to match the output and make the output more significant
-            key_index = self.get_lock_level_info(level, unit='ns')[-1]
-            #*_, key_index= self.get_lock_level_info(level)
-            avg_key_index += key_index
-        return avg_key_index/2
+        return self._key_index
+
+    def update_info(self):
+        """
+        Compute the info of every lock level and the key index of the latest shots
+        """
+        self._level_info = [self.compute_lock_level_info(LOCK_LEVEL_PR),
+                            self.compute_lock_level_info(LOCK_LEVEL_EX)]
+        self._key_index = key_index_of(self._level_info) if self.has_delta() else 0
 
 
     def _get_data_field_indexed(self, data_field, index=-1):
@@ -404,7 +691,7 @@ class Lock():
             return 0
         latter = self._get_data_field_indexed(data_field, -1)
         former = self._get_data_field_indexed(data_field, -2)
-        if math.isinf(float(latter)) or math.isinf(float(former)):
+        if math.isinf(latter) or math.isinf(former):
             return float('inf')
         return float(latter) - float(former)
 
@@ -445,6 +732,461 @@ class Lock():
         else:
             return None
 
+class LockView(Lock):
+    """
+    A Lock that reads its shots from a row of a LockTable,
+    it is created on demand, e.g. for a LockSet
+    """
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+        self._node = table.node
+        self._name = table.name_of(row)
+
+    def has_delta(self):
+        return self._table.has_delta(self._row)
+
+    def get_lock_level_info(self, lock_level, unit='ns'):
+        if unit != 'ns':
+            return self.compute_lock_level_info(lock_level, unit)
+        return self._table.level_info(self._row, lock_level)
+
+    def get_key_index(self):
+        return self._table.key_index[self._row]
+
+    def append(self, shot):
+        """
+        Append a shot to the row of the lock, None sets the lock invalid
+        """
+        if shot is None:
+            self._table.shots[self._row] = 0
+            self._table.update_info(self._row)
+        else:
+            self._table.append(self._row, shot)
+
+    def append_unchanged(self):
+        self._table.append_unchanged(self._row)
+
+    def is_changed(self):
+        return self._table.is_changed(self._row)
+
+    def _get_data_field_indexed(self, data_field, index=-1):
+        return self._table.get_value(self._row, data_field, index)
+
+class LockSample(Lock):
+    """
+    The level info, the key index and the hang times of a row of a LockTable
+    in a complete sample. The report reads them while the node may already
+    parse its next sample into the LockTable
+    """
+    def __init__(self, table, row):
+        self._node = table.node
+        self._name = table.name_of(row)
+        self._level_info = [table.level_info(row, LOCK_LEVEL_PR),
+                            table.level_info(row, LOCK_LEVEL_EX)]
+        self._key_index = table.key_index[row]
+        self._hang_time = {}
+        for field in LockTable.HANG_FIELDS.values():
+            self._hang_time[field] = table.get_value(row, field, -1)
+
+    def has_delta(self):
+        return True
+
+    def _get_data_field_indexed(self, data_field, index=-1):
+        if index != -1:
+            return None
+        return self._hang_time.get(data_field)
+
+class LockTable(object):
+    """
+    The locks of one node, stored by columns.
+    Every lockres has a row, the counters of its two latest shots are kept in
+    typed arrays, instead of a Lock and two Shot objects per lockres.
+    The rows of the disappeared lockres are put in a free-list and reused.
+    It works like the dict of the locks of the node, table[lock_name] returns
+    a LockView of the row.
+    If history is set, the counters of the last history samples of every row are
+    kept in a ring, and the delta of a lock is taken over the last window seconds
+    instead of the last interval
+    """
+    # the counters of the previous and the current shot of a row
+    COUNTERS = ("lock_num_prmode", "lock_num_exmode", "lock_total_prmode", "lock_total_exmode")
+    # the total time that is inf when the lock hangs, and its hang time
+    HANG_FIELDS = {"lock_total_prmode": "lock_prmode_hang_time",
+                   "lock_total_exmode": "lock_exmode_hang_time"}
+    # the number of the rows added when the table is full
+    GROW_ROWS = 1024
+    # the total time of a hanging lock in the ring of the samples
+    HUNG = -1
+
+    def __init__(self, node, history=0, window=0):
+        self.node = node
+        # lock name : row, and row : lock name, None for a free row
+        self._index = {}
+        self._names = []
+        self._free = []
+        # the number of the valid shots of a row, 0, 1 (the previous one) or 2
+        self.shots = array.array("b")
+        self.fresh = array.array("b")
+        # the fingerprint of the last raw line, and the lock_wait of the last shot
+        self.fingerprint = array.array(_INT_ARRAY)
+        self.wait = array.array(_INT_ARRAY)
+        # the lock_refresh of the last shot, and the number of the rows whose counters
+        # were reset in the current sample
+        self.refresh = array.array(_INT_ARRAY)
+        self.resets = 0
+        # the delta time, delta num and average of every lock level, and the key index
+        # of the latest shots, they are computed once when a shot is appended
+        self._level_info = [tuple(array.array("d") for _ in range(3))
+                            for _ in (LOCK_LEVEL_PR, LOCK_LEVEL_EX)]
+        self.key_index = array.array("d")
+        # the time of the current sample, and the last sample in which a row was acquired
+        self.now = 0
+        self.last_active = array.array("d")
+        # field : the column of the previous shot and of the current shot
+        self._prev = {}
+        self._cur = {}
+        for field in LockTable.COUNTERS:
+            self._prev[field] = array.array(_INT_ARRAY)
+            self._cur[field] = array.array(_INT_ARRAY)
+        for field in LockTable.HANG_FIELDS.values():
+            self._prev[field] = array.array("d")
+            self._cur[field] = array.array("d")
+        # the ring of the samples: the sample number, the time of the last history
+        # samples, and the first sample of the window
+        self.history = history
+        self.window = window
+        self._seq = 0
+        self._times = [0] * history
+        self._window_seq = 0
+        # the first sample in the ring of a row and the last sample written to it
+        self._first_seq = array.array(_INT_ARRAY)
+        self._last_seq = array.array(_INT_ARRAY)
+        # field : the counters of sample seq of a row are at row * history + seq % history,
+        # HUNG is kept for the total time of a hanging lock
+        self._ring = {}
+        if history:
+            for field in LockTable.COUNTERS:
+                self._ring[field] = array.array(_INT_ARRAY)
+
+    def _grow(self):
+        """
+        Add free rows to the table, the size of the table is doubled
+        """
+        start = len(self._names)
+        count = max(LockTable.GROW_ROWS, start)
+        columns = [self.shots, self.fresh, self.fingerprint, self.wait, self.refresh,
+                   self.last_active, self.key_index,
+                   self._first_seq, self._last_seq] + \
+                  list(self._prev.values()) + list(self._cur.values()) + \
+                  [column for info in self._level_info for column in info]
+        for column in columns:
+            column.extend(array.array(column.typecode, [0]) * count)
+        for column in self._ring.values():
+            column.extend(array.array(column.typecode, [0]) * (count * self.history))
+        self._names.extend([None] * count)
+        # the lower rows are used first
+        self._free.extend(range(start + count - 1, start - 1, -1))
+
+    def add(self, lock_name):
+        """
+        Return a new row for the lock name
+        """
+        if not self._free:
+            self._grow()
+        row = self._free.pop()
+        self._names[row] = lock_name
+        self._index[lock_name] = row
+        self.shots[row] = 0
+        self.fresh[row] = 1
+        self.fingerprint[row] = 0
+        self.wait[row] = 0
+        self.refresh[row] = 0
+        self.last_active[row] = self.now
+        self._last_seq[row] = -1
+        self._clear_info(row)
+        return row
+
+    def remove(self, row):
+        """
+        The lockres disappeared, put its row in the free-list
+        """
+        del self._index[self._names[row]]
+        self._names[row] = None
+        self._free.append(row)
+
+    def row(self, lock_name):
+        """
+        Return the row of the lock name, None if it is not in the table
+        """
+        return self._index.get(lock_name)
+
+    def name_of(self, row):
+        return self._names[row]
+
+    def rows(self):
+        """
+        Yield the lock name and the row of every lock, a row can be removed meanwhile
+        """
+        names = self._names
+        for row in range(len(names)):
+            if names[row] is not None:
+                yield names[row], row
+
+    def _write(self, columns, row, shot):
+        for field in LockTable.COUNTERS:
+            hang_field = LockTable.HANG_FIELDS.get(field)
+            hang_time = getattr(shot, hang_field) if hang_field else 0
+            if hang_time:
+                # the total time is inf, it is rebuilt from the hang time
+                columns[hang_field][row] = hang_time
+                columns[field][row] = 0
+            else:
+                if hang_field:
+                    columns[hang_field][row] = 0
+                columns[field][row] = getattr(shot, field)
+
+    def _shift(self, row):
+        """
+        The current shot of the row becomes the previous one
+        """
+        for field, column in self._cur.items():
+            self._prev[field][row] = column[row]
+
+    def begin_sample(self, timestamp):
+        """
+        A new sample of the node begins, the shots appended until the next sample
+        are recorded in its slot of the ring
+        """
+        self.now = timestamp
+        self.resets = 0
+        if not self.history:
+            return
+        self._seq += 1
+        self._times[self._seq % self.history] = timestamp
+        # the oldest sample in the ring that is in the window
+        start = max(1, self._seq - self.history + 1)
+        while start < self._seq and \
+              self._times[start % self.history] < timestamp - self.window - 0.01:
+            start += 1
+        self._window_seq = start
+
+    def _record(self, row, columns):
+        """
+        Record the shot in columns to the slot of the current sample of the row,
+        the history of the row restarts if it missed a sample
+        """
+        if not self.history:
+            return
+        if self._last_seq[row] != self._seq - 1:
+            self._first_seq[row] = self._seq
+        self._last_seq[row] = self._seq
+        slot = row * self.history + self._seq % self.history
+        for field in LockTable.COUNTERS:
+            hang_field = LockTable.HANG_FIELDS.get(field)
+            if hang_field and columns[hang_field][row]:
+                self._ring[field][slot] = LockTable.HUNG
+            else:
+                self._ring[field][slot] = columns[field][row]
+
+    def window_base(self, row):
+        """
+        Return the oldest sample of the row in the window, None if the row has
+        no sample in the window before the current one
+        """
+        if self._last_seq[row] != self._seq:
+            return None
+        base = max(self._window_seq, self._first_seq[row])
+        if base >= self._seq:
+            return None
+        return base
+
+    def has_delta(self, row):
+        """
+        Return True if the row has a shot to compare the latest one with
+        """
+        if self.shots[row] != 2:
+            return False
+        return not self.history or self.window_base(row) is not None
+
+    def is_reset(self, row, shot):
+        """
+        Return True if the lockres of the row was recreated or its counters restarted
+        since the last shot, a counter or lock_refresh went backwards.
+        The total time of a hanging lock is not compared, it is inf
+        """
+        columns = self._cur if self.shots[row] == 2 else self._prev
+        for field in LockTable.COUNTERS:
+            hang_field = LockTable.HANG_FIELDS.get(field)
+            if hang_field and (columns[hang_field][row] or getattr(shot, hang_field)):
+                continue
+            if getattr(shot, field) < columns[field][row]:
+                return True
+        return getattr(shot, "lock_refresh", 0) < self.refresh[row]
+
+    def append(self, row, shot, fingerprint=0):
+        """
+        Append a shot to the row, it is the same as Lock.append.
+        If the counters were reset, the shot is the first one of the row again,
+        the row has no delta in this sample instead of a negative one
+        """
+        self.fresh[row] = 1
+        count = self.shots[row]
+        if count and self.is_reset(row, shot):
+            count = 0
+            self.resets += 1
+        if count == 0:
+            self._write(self._prev, row, shot)
+            self.shots[row] = 1
+            self._last_seq[row] = -1
+            self._record(row, self._prev)
+        else:
+            if count == 2:
+                self._shift(row)
+            self._write(self._cur, row, shot)
+            self.shots[row] = 2
+            self._record(row, self._cur)
+        self.fingerprint[row] = fingerprint
+        self.wait[row] = getattr(shot, "lock_wait", 0)
+        self.refresh[row] = getattr(shot, "lock_refresh", 0)
+        self.update_info(row)
+
+    def append_unchanged(self, row):
+        """
+        The lockres is the same as the last shot, append the last shot again,
+        so the delta of this interval is zero
+        """
+        count = self.shots[row]
+        if count == 0:
+            return
+        self.fresh[row] = 1
+        if count == 1:
+            for field, column in self._prev.items():
+                self._cur[field][row] = column[row]
+            self.shots[row] = 2
+        else:
+            self._shift(row)
+        self._record(row, self._cur)
+        if self.history or self._cur["lock_prmode_hang_time"][row] or \
+           self._cur["lock_exmode_hang_time"][row]:
+            self.update_info(row)
+        else:
+            # the shots are the same, there is no delta
+            self._clear_info(row)
+
+    def _clear_info(self, row):
+        for info in self._level_info:
+            for column in info:
+                column[row] = 0
+        self.key_index[row] = 0
+
+    def update_info(self, row):
+        """
+        Compute the info of every lock level and the key index of the latest shots
+        of the row, the consumers read them instead of the counters
+        """
+        if not self.has_delta(row):
+            self._clear_info(row)
+            return
+        view = LockView(self, row)
+        level_info = [view.compute_lock_level_info(LOCK_LEVEL_PR),
+                      view.compute_lock_level_info(LOCK_LEVEL_EX)]
+        for info, columns in zip(level_info, self._level_info):
+            for value, column in zip(info, columns):
+                column[row] = value
+        self.key_index[row] = key_index_of(level_info)
+
+    def level_info(self, row, lock_level):
+        """
+        Return the delta time, delta num and average of the lock level of the row
+        """
+        columns = self._level_info[lock_level]
+        return columns[0][row], columns[1][row], columns[2][row]
+
+    def un_fresh(self, row):
+        """
+        Every time get raw string from nodes, unfresh the lock,
+        return False if the lock is not fresh any more
+        """
+        if self.fresh[row] > 0:
+            self.fresh[row] -= 1
+        else:
+            self.fresh[row] = -1
+        return self.fresh[row] >= 0
+
+    def is_same_line(self, row, fingerprint):
+        """
+        Return True if the raw line of the lockres has the fingerprint of the last shot,
+        and the last shot can be appended again. A waiting lock is always parsed,
+        its hang time grows even if the line is the same
+        """
+        return self.fingerprint[row] == fingerprint and self.shots[row] > 0 and \
+               not self.wait[row]
+
+    def coldest(self, count):
+        """
+        Return the count rows that have not been acquired for the longest time,
+        the waiting locks are kept, their hang time is shown
+        """
+        rows = [(self.last_active[row], row) for _, row in self.rows() if not self.wait[row]]
+        return [row for _, row in heapq.nsmallest(count, rows)]
+
+    def is_changed(self, row):
+        """
+        Return True if the lock was acquired between the two latest shots
+        """
+        if self.shots[row] != 2:
+            return False
+        return self._prev["lock_num_prmode"][row] != self._cur["lock_num_prmode"][row] or \
+               self._prev["lock_num_exmode"][row] != self._cur["lock_num_exmode"][row]
+
+    def get_value(self, row, field, index=-1):
+        """
+        Return the field of the shot at index (-1 the latest, -2 the previous one)
+        of the row, None if there is no such shot or field, like Lock._get_data_field_indexed
+        """
+        count = self.shots[row]
+        if index in (-2, 0) and self.history and field in self._ring:
+            # the previous shot is the oldest one in the window
+            base = self.window_base(row)
+            if base is None:
+                return None
+            value = self._ring[field][row * self.history + base % self.history]
+            return float('inf') if value == LockTable.HUNG else value
+        if index in (-1, 1):
+            columns = self._cur if count == 2 else None
+        elif index in (-2, 0):
+            columns = self._prev if count >= 1 else None
+        else:
+            columns = None
+        if columns is None or field not in columns:
+            return None
+        hang_field = LockTable.HANG_FIELDS.get(field)
+        if hang_field and columns[hang_field][row]:
+            return float('inf')
+        return columns[field][row] or 0
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, lock_name):
+        return lock_name in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def get(self, lock_name, default=None):
+        row = self._index.get(lock_name)
+        if row is None:
+            return default
+        return LockView(self, row)
+
+    def __getitem__(self, lock_name):
+        return LockView(self, self._index[lock_name])
+
 class LockSet():
     """
     locks which has the same name but on different node
@@ -566,6 +1308,8 @@ class LockSet():
             res_pr["total_num"] += pr_total_num
             config.pr_locks += pr_total_num
             node_name = util.get_hostname() if not _node.name else _node.name
+            if _node.stale:
+                node_name += STALE_MARKER
 
             if util.PY2:
                 node_detail_format = "{0:25}{1:<12}{2:<12}{3:<12}{4:<12}{5:<12}{6:<12}"
@@ -642,82 +1386,50 @@ class LockSetGroup():
     TITLE_FORMAT = "{0:21}{1:12}{2:12}{3:12}{4:12}{5:12}{6:12}"
     DATA_FORMAT = "{0:21}{1:<12}{2:<12}{3:<12}{4:<12}{5:<12}{6:<12}"
 
-    def __init__(self, max_sys_inode_num, lock_space, max_length=600):
-        self.lock_set_list = []
+    def __init__(self, max_sys_inode_num, lock_space, max_length=None):
         self._max_sys_inode_num = max_sys_inode_num
         self.lock_space = lock_space
         self._debug = self.lock_space._debug
-        self._sort_flag = False
-        self._max_length = max_length
+        self._max_length = max_length if max_length is not None else config.RANK_LIMIT
+        # the bounded min-heaps of (key_index, -seq, lock_set) of the user inodes
+        # and of the system inodes, the smallest one is at the top
+        self._heap = []
+        self._sys_heap = []
+        self._seq = 0
 
-    def append(self, lock_set):
+    @property
+    def lock_set_list(self):
         """
-        Append lockset to this group, If the length of self.lock_set_list is more than self._max_length,
-        We use a elimination algorithm to eliminate the smallest lock_set in self.lock_set_list,
-        and keep the length of self.lock_set_list always self._max_length
+        Return all the ranked lock sets, in descending order of the key index
         """
-        lock_set.get_key_index()
-        if len(self.lock_set_list) >= self._max_length:
-            new_key_index = lock_set.key_index
-            if new_key_index == 0:
-                return
-            if not self._sort_flag:
-                self.lock_set_list.sort(key=lambda x: x.key_index, reverse=True)
-                self._sort_flag = True
-            begin = 0
-            end = len(self.lock_set_list) - 1
-            while begin <= end:
-                middle = (begin + end)//2
-                if self.lock_set_list[middle].key_index == new_key_index:
-                    self.lock_set_list.insert(middle, lock_set)
-                    del self.lock_set_list[-1]
-                    break
-                elif end - begin == 1:
-                    if begin == 0 and self.lock_set_list[begin].key_index < new_key_index:
-                        self.lock_set_list.insert(begin, lock_set)
-                    elif end == len(self.lock_set_list) - 1 \
-                         and self.lock_set_list[end].key_index > new_key_index:
-                        break
-                    else:
-                        self.lock_set_list.insert(end, lock_set)
-                    del self.lock_set_list[-1]
-                    break
-                elif self.lock_set_list[middle].key_index > new_key_index:
-                    if begin == end and begin != len(self.lock_set_list)-1:
-                        self.lock_set_list.insert(middle+1, lock_set)
-                        del self.lock_set_list[-1]
-                        break
-                    else:
-                        begin = middle
-                elif self.lock_set_list[middle].key_index < new_key_index:
-                    if begin == end:
-                        self.lock_set_list.insert(begin, lock_set)
-                        del self.lock_set_list[-1]
-                        break
-                    else:
-                        end = middle
-        else:
-            self.lock_set_list.append(lock_set)
+        return [i[-1] for i in sorted(self._heap + self._sys_heap, reverse=True)]
 
-    def filter_zero(self, index_list):
+    def is_sys_inode(self, lock_set):
+        return int(lock_set.inode_num) <= self._max_sys_inode_num
+
+    def append(self, lock_set):
         """
-        Filter the zero line in index_list
-        We use it befor display
+        Rank the lock set, only the self._max_length lock sets with the biggest key index
+        are kept, in a min-heap, the smallest one is replaced by a bigger one.
+        The lock sets whose key index is 0 are not ranked, and the system inodes are
+        ranked in their own heap, so they never push a user inode out
         """
-        ret_list = []
-        if not index_list:
-            return index_list
-        if index_list[-1].key_index > 0:
-            return index_list
-        for i in index_list:
-            if i.key_index != 0:
-                ret_list.append(i)
-        return ret_list
+        key_index = lock_set.get_key_index()
+        if key_index <= 0 or self._max_length <= 0:
+            return
+        heap = self._sys_heap if self.is_sys_inode(lock_set) else self._heap
+        # the lock set appended first wins a tie
+        self._seq += 1
+        item = (key_index, -self._seq, lock_set)
+        if len(heap) < self._max_length:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
 
     def get_top_n_key_index(self, top_n, debug=False):
         """
-        According LockSet method get_key_index to sort the group,
-        and return the top n lock set
+        Return the top n lock sets of the user inodes,
+        and of the system inodes too in the debug mode
         """
         if not top_n:
             rows, cols = os.popen('stty size', 'r').read().split()
@@ -726,38 +1438,48 @@ class LockSetGroup():
             else:
                 top_n = (int(rows) - 6)
             config.ROWS = top_n
-        if not self._sort_flag:
-            self.lock_set_list.sort(key=lambda x: x.key_index, reverse=True)
-        if debug:
-            if len(self.lock_set_list) > top_n:
-                return self.filter_zero(self.lock_set_list[:top_n])
-            return self.filter_zero(self.lock_set_list)
-        ret = []
-        for i in self.lock_set_list:
-            if int(i.inode_num) > self._max_sys_inode_num:
-                ret.append(i)
-                if len(ret) == top_n:
-                    return self.filter_zero(ret)
-        return self.filter_zero(ret)
+        heap = self._heap + self._sys_heap if debug else self._heap
+        return [i[-1] for i in heapq.nlargest(top_n, heap)]
 
     def report_once(self, top_n):
         """
         Accordng the para top_n, splice the "simple" and "detailed" format string
         """
-        self.sort_flag = False
-        time_stamp = str(util.now())
-        if '.' in time_stamp:
-            time_stamp = time_stamp.split('.')[0]
+        if self.lock_space.scheduler.tick is not None:
+            time_stamp = time.strftime("%Y-%m-%d %H:%M:%S",
+                                       time.localtime(self.lock_space.scheduler.tick))
+        else:
+            time_stamp = str(util.now())
+            if '.' in time_stamp:
+                time_stamp = time_stamp.split('.')[0]
         top_n_lock_set = self.get_top_n_key_index(top_n, debug=self._debug)
         what = LockSetGroup.TITLE_FORMAT.format(
             "TYPE INO  ", "EX NUM", "EX TIME(ns)", "EX AVG(ns)",
             "PR NUM", "PR TIME(ns)", "PR AVG(ns)")
         lsg_report_simple = ""
         lsg_report_simple += time_stamp + " lock acquisitions: total {0}, EX {1}, PR {2}\n"
-        lsg_report_simple += "lock resources: {3}\n\n"
-        lsg_report_simple += what + "\n"
-
+        lsg_report_simple += "lock resources: {3}\n"
+        if config.WINDOW:
+            lsg_report_simple += "window: last {0}s\n".format(config.WINDOW)
+        intervals = self.lock_space.interval_summary()
+        if intervals:
+            lsg_report_simple += intervals + "\n"
+        stale = self.lock_space.stale_summary()
+        if stale:
+            lsg_report_simple += stale + "\n"
+        resets = self.lock_space.reset_summary()
+        if resets:
+            lsg_report_simple += resets + "\n"
+        transport = self.lock_space.transport_summary()
+        if transport:
+            lsg_report_simple += transport + "\n"
+        # the capture window of the nodes is only shown in the detailed view
         lsg_report_detailed = lsg_report_simple
+        capture = self.lock_space.capture_summary()
+        if capture:
+            lsg_report_detailed += capture + "\n"
+        lsg_report_simple += "\n" + what + "\n"
+        lsg_report_detailed += "\n" + what + "\n"
 
         for lock_set in top_n_lock_set:
             lock_set_report = lock_set.report_once()
@@ -782,7 +1504,6 @@ class LockSetGroup():
                                                          config.ex_locks,
                                                          config.pr_locks,
                                                          types)
-        self.lock_space._lock_types = {}
         config.ex_locks = 0
         config.pr_locks = 0
 
@@ -791,10 +1512,55 @@ class LockSetGroup():
 class Node:
     def __init__(self, lock_space, node_name=None):
         self._lock_space = lock_space
-        self._locks = {}
+        self._locks = LockTable(self, config.HISTORY if config.WINDOW else 0, config.WINDOW)
         self.major, self.minor, self.mount_point = \
             util.lockspace_to_device(self._lock_space.name, node_name)
         self._node_name = node_name
+        self._cat = None
+        # the time when the last sample started and finished
+        self.capture_start = None
+        self.capture_end = None
+        # the adaptive interval of this node, None means it is collected at every tick
+        self.interval = None
+        if config.ADAPTIVE:
+            self.interval = scheduler.AdaptiveInterval(config.MIN_INTERVAL, config.MAX_INTERVAL)
+        # the tick of the last sample, the number of the samples and the fraction
+        # of the lockres changed in the last sample
+        self.last_tick = None
+        self.samples = 0
+        self.churn = 0
+        # the number of the ticks this node missed the deadline or failed since its last sample
+        self.stale_ticks = 0
+        # the fields extracted from every line of the locking_state, and the projection
+        # compiled for the debug version of this node, it is negotiated at the first line
+        self.projection = Shot.stat_projection
+        self.parser = None
+        # the number of the lines in the last sample that were the same as the last shot
+        self.unchanged_lines = 0
+        # the lock types to track, the lockres of the other types are not parsed,
+        # only the fingerprints of their lines are kept to count the changed ones.
+        self.lock_types = config.LOCK_TYPES
+        # lock name : the fingerprint of the last line, of the lockres that are not tracked,
+        # the lockres of the filtered types, and the evicted lockres. An evicted lockres
+        # is tracked again once its line changes
+        self._untracked = {}
+        # the decoded names of the lockres tracked by this node
+        self.name_cache = LockNameCache()
+        # the number of the lockres evicted because they were idle for config.IDLE_TTL
+        # seconds, and because more than config.MAX_LOCKS lockres were tracked
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+        # the LockSample of the lockres that have a key index, by their names, the number
+        # of the changed lockres of every type and the number of the reset lockres, in the
+        # last complete sample. They are only replaced by the thread of this node when a
+        # sample completes, and merged by the lockspace at the report barrier, so the
+        # report never reads the LockTable that the thread of the node is parsing into
+        self.active_locks = {}
+        self.type_counts = {}
+        self._sample_types = {}
+        self._resets = 0
+        # the tick that the current sample was requested for
+        self.sample_tick = None
 
 
     def is_local_node(self):
@@ -817,110 +1583,311 @@ class Node:
     def lock_space(self):
         return self._lock_space
 
-    def process_one_shot(self, raw_string):
+    @property
+    def cat(self):
+        """
+        The Cat object of this node, it is created once and reused in every interval,
+        so the persistent collectors can keep their channel open
+        """
+        if self._cat is None:
+            if self.is_local_node():
+                self._cat = cat.gen_cat('local', self.lock_space.name)
+            else:
+                self._cat = cat.gen_cat(config.COLLECTOR, self.lock_space.name, self.name)
+        return self._cat
+
+    def transport_info(self):
+        """
+        Return the bytes received from this node, the bytes after decoding them
+        and the codec used by the collector
+        """
+        if self._cat is None:
+            return 0, 0, None
+        return self._cat.bytes_on_wire, self._cat.bytes_decoded, self._cat.codec
+
+    def process_one_shot(self, raw_string, lock_name=None):
         """
-        Trun the raw_string to a Shot object
+        Trun the raw_string to a Shot object and append it to its Lock,
+        a line that is the same as the last line of the lockres is not parsed
         parameters:
             raw_string: is a line form file locking_state
-        """
-        shot = Shot(raw_string)
-        if not shot.legal():
-            return
+            lock_name: the lock name in raw_string if it is already split
+        """
+        if lock_name is None:
+            try:
+                lock_name = raw_string.split(None, 2)[1]
+            except IndexError:
+                return None
+        # most of the lockres are idle, if the line is the same as the last one,
+        # the last shot is reused instead of parsing the line again
+        fingerprint = hash(raw_string)
+        locks = self._locks
+        row = locks.row(lock_name)
+        if row is not None and locks.is_same_line(row, fingerprint):
+            locks.append_unchanged(row)
+            self.unchanged_lines += 1
+            return locks.name_of(row)
+        try:
+            if self.parser is None:
+                self.negotiate(raw_string)
+            try:
+                shot = Shot(raw_string, projection=self.parser)
+            except VersionMismatch:
+                shot = Shot(raw_string, projection=self.negotiate(raw_string))
+        except (ValueError, IndexError, AssertionError):
+            return None
         shot_name = shot.name
-        if shot_name not in self._locks:
-            lock_tmp = Lock(self)
-            lock_tmp.append(shot)
-            self._locks[shot_name] = lock_tmp
+        shot_name._decoded = self.name_cache.get(lock_name)
+        if not shot.legal():
+            if row is None:
+                self.name_cache.evict(lock_name)
+            return None
+        if row is None:
+            row = locks.add(shot_name)
+            locks.append(row, shot, fingerprint)
         else:
-            self._locks[shot_name].append(shot)
-            if self._locks[shot_name].get_key_index() > 0:
-                self._lock_space.add_lock_type(shot_name)
-        self._lock_space.add_lock_name(shot_name)
-        # self._lock_space.add_lock_type(shot_name)
-
-    def del_unfreshed_node(self):
-        for key in self._locks.keys():
-            if self._locks[key].refresh_flag == False:
-                self._locks.pop(key)
-            else:
-                self._locks[key].refresh_flag = False
-
-    def add_last_slot_to_unfreshed_node(self):
-        for key in self._locks.keys():
-            if not self._locks[key].refresh_flag:
-                if self._locks[key]._shots:
-                    self._locks[key].append(self._locks[key]._shots[-1])
-                else:
-                    self._locks.pop(key)
-            self._locks[key].refresh_flag = False
+            locks.append(row, shot, fingerprint)
+            if locks.key_index[row] > 0:
+                lock_type = shot_name.lock_type
+                self._sample_types[lock_type] = self._sample_types.get(lock_type, 0) + 1
+        return shot_name
 
-    def process_all_slot_worker(self, raw_slot_strs, run_once_finished_semaphore):
+    def negotiate(self, raw_string):
         """
-        The worker that process the file locking state, the method will be use as a thread method
+        Compile the projection of this node for the debug version of raw_string,
+        the following lines are parsed without detecting their version.
+        It happens again only if the node reports another version, e.g. the kernel
+        was upgraded
         """
+        version = int(raw_string.split(None, 1)[0], 16)
+        self.parser = self.projection.compile(version)
+        if config.DEBUG:
+            print("[DEBUG] node {0} reports the locking_state debug version {1}"
+                  .format(self._node_name, version))
+        return self.parser
+
+    @staticmethod
+    def is_empty_cat(raw_slot_strs):
+        """
+        Return True if the collector got nothing from the node,
+        an empty DeltaSnapshot means nothing changed, it still has to be processed
+        """
+        return not raw_slot_strs and not isinstance(raw_slot_strs, cat.DeltaSnapshot)
+
+    def process_all_slots(self, raw_slot_strs):
+        """
+        Process the file locking state of one interval
+        If raw_slot_strs is a cat.DeltaSnapshot, the locks that are not in it are unchanged
+        since the last interval, and the TOMBSTONE lines are the locks that disappeared.
+        raw_slot_strs can be a generator that yields the lines while they arrive
+        from the collector, each line is parsed as soon as it is read.
+        Return False if the collector got nothing, the locks are kept as they are
+        """
+        delta = isinstance(raw_slot_strs, cat.DeltaSnapshot)
+        # touched contains the changed and the disappeared locks in the delta mode
+        touched = set()
+        line_count = 0
+        changed = 0
+        self.unchanged_lines = 0
+        # the fingerprints of the untracked lockres, and the number of the changed ones
+        # of every filtered type. A delta only has the changed lines, the others are kept
+        untracked = self._untracked if delta else {}
+        # the number of the changed lockres of every type, the tracked ones are counted
+        # by process_one_shot
+        sample_types = self._sample_types = {}
         for i in raw_slot_strs:
-            self.process_one_shot(i)
-        for lock_name, lock_obj in self._locks.items():
-            lock_obj.un_fresh_lock()
-            if not lock_obj.is_fresh_lock():
-                    lock_obj.append(None)
-                #del self._locks[lock_name]
-        run_once_finished_semaphore.release()
-
-    def run_once_consumer(self, sort_finished_semaphore, run_once_finished_semaphore):
-        """
-        The concumer of the productor-consumer module, it get the raw_date form productor
-        and use a thread to process the raw string.
-        """
-        while True:
-            # the next line must before semaphore,
-            (raw_slot_strs, sleep_time) = yield ''
-            sort_finished_semaphore.acquire()
-            if not raw_slot_strs:
-                run_once_finished_semaphore.release()
+            line_count += 1
+            if line_count == 1:
+                self._locks.begin_sample(self.sample_time())
+            if delta and i.startswith(cat.TOMBSTONE):
+                touched.add(i[len(cat.TOMBSTONE):])
+                untracked.pop(i[len(cat.TOMBSTONE):], None)
                 continue
-            if config.DEBUG:
-                print("[DEBUG] got the data on node {0}".format(self._node_name))
-            consumer_process = threading.Thread(target=self.process_all_slot_worker,
-                                                args=(raw_slot_strs, run_once_finished_semaphore))
-            consumer_process.daemon = True
-            consumer_process.start()
-            if sleep_time > 0:
-                time.sleep(sleep_time)
+            lock_name = None
+            if self.lock_types is not None or self._untracked:
+                strings = i.split(None, 2)
+                if len(strings) < 2:
+                    continue
+                lock_name = strings[1]
+                filtered = self.lock_types is not None and lock_name[0] not in self.lock_types
+                if filtered or lock_name in self._untracked:
+                    fingerprint = hash(i)
+                    last = self._untracked.get(lock_name)
+                    if last is None or last == fingerprint or filtered:
+                        if last is not None and last != fingerprint:
+                            sample_types[lock_name[0]] = \
+                                sample_types.get(lock_name[0], 0) + 1
+                        untracked[lock_name] = fingerprint
+                        continue
+                    # the evicted lockres is acquired again
+                    untracked.pop(lock_name, None)
+            shot_name = self.process_one_shot(i, lock_name)
+            if delta and shot_name is not None:
+                touched.add(str(shot_name))
+        if not line_count:
+            if not delta:
+                # the collector got nothing from the node, keep the locks as they are
+                return False
+            self._locks.begin_sample(self.sample_time())
+        locks = self._locks
+        idle_deadline = locks.now - config.IDLE_TTL
+        # the lockres that have a key index in this sample, they are ranked in the report
+        active = {}
+        for lock_name, row in locks.rows():
+            if delta and str(lock_name) not in touched:
+                locks.append_unchanged(row)
+            if not locks.un_fresh(row):
+                # the lockres disappeared, its row is reused
+                self.remove_lock(row)
+                continue
+            if locks.key_index[row] > 0:
+                active[lock_name] = LockSample(locks, row)
+            if locks.is_changed(row):
+                changed += 1
+                locks.last_active[row] = locks.now
+            elif config.IDLE_TTL and locks.last_active[row] < idle_deadline \
+                 and not locks.wait[row]:
+                self.evict(row, untracked)
+                self.evicted_idle += 1
+        if config.MAX_LOCKS and len(locks) > config.MAX_LOCKS:
+            for row in locks.coldest(len(locks) - config.MAX_LOCKS):
+                self.evict(row, untracked)
+                self.evicted_lru += 1
+        self._untracked = untracked
+        self.active_locks = active
+        self.type_counts = sample_types
+        self._resets = locks.resets
+        self.churn = float(changed) / len(self._locks) if self._locks else 0
+        if config.DEBUG:
+            print("[DEBUG] {0} of {1} lines are not changed on node {2}"
+                  .format(self.unchanged_lines, line_count, self._node_name))
+            if locks.resets:
+                print("[DEBUG] the counters of {0} lockres were reset on node {1}"
+                      .format(locks.resets, self._node_name))
+        return True
 
+    @property
+    def resets(self):
+        """
+        Return the number of the lockres whose counters were reset in the last
+        complete sample
+        """
+        return self._resets
 
-    def run_once(self, consumer):
+    @property
+    def untracked_count(self):
         """
-        The productor of the productor and consumer module, it get the raw string by _cat,
-        and sent the raw string to consumer
+        Return the number of the lockres that are not tracked, filtered or evicted
         """
-        if util.PY2:
-            consumer.next()
-        else:
-            consumer.__next__()
-        while True:
-            start = time.time()
-            if self.is_local_node():
-                _cat = cat.gen_cat('local', self.lock_space.name)
-            else:
-                _cat = cat.gen_cat('ssh', self.lock_space.name, self.name)
-            raw_slot_strs = _cat.get()
-            cat_time = time.time() - start
+        return len(self._untracked)
+
+    def evict(self, row, untracked):
+        """
+        Stop tracking the lockres of the row, only the fingerprint of its last line is kept
+        in untracked, so it is not parsed again until its line changes
+        """
+        untracked[str(self._locks.name_of(row))] = self._locks.fingerprint[row]
+        self.remove_lock(row)
+
+    def remove_lock(self, row):
+        """
+        Drop the lockres of the row from the lock table
+        """
+        lock_name = self._locks.name_of(row)
+        self._locks.remove(row)
+        self.name_cache.evict(str(lock_name))
+
+    def sample_time(self):
+        """
+        Return the time of the current sample, it is the tick that the sample
+        was requested for, a late sample keeps its own tick
+        """
+        tick = self.sample_tick
+        if tick is None:
+            tick = self._lock_space.scheduler.tick
+        return tick if tick is not None else time.time()
+
+    def collect_once(self, tick=None):
+        """
+        Collect and process one sample of this node for the tick, and record the
+        capture window. The collectors may stream the lines while they are processed,
+        so the capture ends when the last line is processed.
+        A sample that fails or gets nothing, e.g. the node is unreachable or its
+        channel was closed because it was stale for too long, is dropped and the
+        node keeps its last complete sample, marked stale
+        """
+        self.capture_start = time.time()
+        self.sample_tick = tick
+        processed = False
+        try:
+            raw_slot_strs = self.cat.get()
             if config.DEBUG:
-                print("[DEBUG] cat takes {0}s on node {1}".format(cat_time, self._node_name))
-            if self._lock_space.first_run:
-                consumer.send((raw_slot_strs, 1-cat_time-cat_time))
-            else:
-                #consumer.send((raw_slot_strs, config.INTERVAL-cat_time-cat_time))
-                consumer.send((raw_slot_strs, config.INTERVAL-cat_time-cat_time))
-        consumer.close()
+                print("[DEBUG] cat takes {0}s on node {1}"
+                      .format(time.time() - self.capture_start, self._node_name))
+            if not self.is_empty_cat(raw_slot_strs):
+                processed = self.process_all_slots(raw_slot_strs)
+        except Exception as expt:
+            if config.DEBUG:
+                util.eprint("[DEBUG] collecting node {0} failed: {1!r}"
+                            .format(self._node_name, expt))
+        if processed:
+            self.finish_capture()
+        else:
+            self.fail_capture()
+
+    def is_due(self, tick):
+        """
+        Return True if this node should be collected at the tick,
+        the first two samples are always taken, so the first delta comes quickly
+        """
+        if self.interval is None or self.samples < 2:
+            return True
+        # tolerate the float error of the ticks
+        return tick - self.last_tick >= self.interval.interval - 0.01
+
+    @property
+    def stale(self):
+        """
+        Return True if the last sample of this node missed the deadline or failed
+        """
+        return self.stale_ticks > 0
+
+    def close_cat(self):
+        """
+        Drop the collector channel of this node, a collection that hangs on it
+        fails and the next one reconnects
+        """
+        if self._cat is not None and hasattr(self._cat, "close"):
+            self._cat.close()
 
+    def finish_capture(self):
+        """
+        The sample of the current tick is processed, record it and
+        tune the interval of this node
+        """
+        self.capture_end = time.time()
+        self.last_tick = self.sample_time()
+        self.samples += 1
+        self.stale_ticks = 0
+        if self.interval is not None and self.samples > 1:
+            self.interval.update(self.capture_end - self.capture_start, self.churn)
+
+    def fail_capture(self):
+        """
+        The sample of the current tick failed or got nothing, the last sample
+        is kept but it is stale, so it is not reported as the data of this tick
+        """
+        self.capture_end = time.time()
+        self.stale_ticks += 1
+        if config.DEBUG:
+            print("[DEBUG] node {0} got no sample {1} time(s)"
+                  .format(self._node_name, self.stale_ticks))
 
     def __contains__(self, item):
         return item in self._locks
 
     def __getitem__(self, key):
-        return self._locks.get(key, None)
+        return self._locks.get(key)
 
     def get_lock_names(self):
         return self._locks.keys()
@@ -931,17 +1898,19 @@ class LockSpace:
     """
     def __init__(self, node_name_list, lock_space, max_sys_inode_num, debug, display_len=10):
         #pdb.set_trace()
-        self._mutex = threading.Lock()
         self._max_sys_inode_num = max_sys_inode_num
         self._debug = debug
         self._display_len = display_len
         self._name = lock_space
         self._nodes = {} #node_list[i] : Node
-        self._lock_names = []
+        # the names of the lockres to rank and the number of the changed lockres of every
+        # type, they are merged from the nodes at the report barrier
+        self._lock_names = set()
         self._lock_types = {}
+        # the active_locks of every node, as they were at the report barrier
+        self._active_locks = []
         self.should_stop = False
-        self._thread_list = []
-        self.first_run = True
+        self.scheduler = scheduler.Scheduler(config.INTERVAL)
         if node_name_list is None:
             # node name None means this is a local node
             self._nodes['local'] = Node(self, None)
@@ -958,53 +1927,119 @@ class LockSpace:
 
     def run(self, printer_queue, interval=5, ):
         """
-        The main code of o2locktop
-        """
-        self._lock_names = []
-        self._thread_list = []
-        self.run_once_finished_semaphore = []
-        self.sort_finished_semaphore = []
-        for _, node in self._nodes.items():
-            temp_run_once_finished_semaphore = threading.Semaphore(0)
-            self.run_once_finished_semaphore.append(temp_run_once_finished_semaphore)
-            temp_sort_finished_semaphore = threading.Semaphore(1)
-            self.sort_finished_semaphore.append(temp_sort_finished_semaphore)
-            thread = threading.Thread(
-                target=node.run_once,
-                args=(node.run_once_consumer(temp_sort_finished_semaphore,
-                                             temp_run_once_finished_semaphore),))
-            self._thread_list.append(thread)
-        for thread in self._thread_list:
-            thread.start()
-        if config.DEBUG:
-            print("[DEBUG] the length of thread list is {0}".format(len(self._thread_list)))
+        The main code of o2locktop, collect the nodes with the engine in config.ENGINE
+        """
+        if config.ADAPTIVE:
+            # the nodes are collected at the ticks of the minimal interval
+            interval = config.MIN_INTERVAL
+        if config.ENGINE == "asyncio":
+            # python2 does not have asyncio, so import it only when it is used
+            from o2locktoplib import aio
+            aio.AsyncEngine(self).run(printer_queue, interval)
+        else:
+            self._run_threads(printer_queue, interval)
+
+    def publish_report(self, printer_queue):
+        """
+        Generate the report of this interval and send it to the printer
+        """
+        lock_space_report = self.report_once()
+        printer_queue.put({'msg_type':'new_content',
+                           'simple':lock_space_report['simple'],
+                           'detailed':lock_space_report['detailed'],
+                           'rows':config.ROWS})
+
+    def _run_threads(self, printer_queue, interval):
+        """
+        The thread engine, at every tick of the scheduler all the nodes are collected
+        by one thread each, and the report is generated after all of them finished
+        """
+        self.scheduler.interval = interval
+        # node : the thread that collects the node
+        workers = {}
         while not self.should_stop:
-            start = time.time()
-            if config.DEBUG:
-                print("[DEBUG] the length of semaphore list is {0}"
-                      .format(len(self.run_once_finished_semaphore)))
-            for semaphore in self.run_once_finished_semaphore:
-                semaphore.acquire()
-            lock_space_report = self.report_once()
-            printer_queue.put({'msg_type':'new_content',
-                               'simple':lock_space_report['simple'],
-                               'detailed':lock_space_report['detailed'],
-                               'rows':config.ROWS})
+            tick = self.scheduler.wait(self.tick_interval())
+            for node in self.due_nodes(tick):
+                if node in workers and workers[node].is_alive():
+                    # the late sample is still running, it is merged into this tick
+                    continue
+                thread = threading.Thread(target=node.collect_once, args=(tick,))
+                thread.daemon = True
+                thread.start()
+                workers[node] = thread
+            deadline = tick + self.deadline()
+            for thread in workers.values():
+                thread.join(max(0, deadline - time.time()))
+            late_nodes = [node for node, thread in workers.items()
+                          if thread.is_alive() and self.is_late(node)]
+            for node in self.mark_stale(late_nodes):
+                node.close_cat()
+            self.finish_tick(printer_queue)
+
+    def deadline(self, node=None):
+        """
+        The seconds after a tick that the report waits for the nodes, or that
+        the sample of the node may take. In the adaptive mode a node is given
+        the interval it is collected at, not the interval of the ticks
+        """
+        if config.DEADLINE:
+            return config.DEADLINE
+        interval = self.scheduler.interval
+        if node is not None and node.interval is not None:
+            interval = max(interval, node.interval.interval)
+        return interval * 0.8
+
+    def is_late(self, node):
+        """
+        Return True if the running sample of the node passed its deadline,
+        a node that is still in its own deadline keeps its last sample without
+        being stale
+        """
+        if node.sample_tick is None:
+            return True
+        return time.time() > node.sample_tick + self.deadline(node)
+
+    def mark_stale(self, late_nodes):
+        """
+        Mark the nodes that missed the deadline of this tick as stale,
+        return the nodes that have been stale for config.STALE_RESET ticks,
+        their collection should be aborted
+        """
+        ret = []
+        for node in late_nodes:
+            node.stale_ticks += 1
             if config.DEBUG:
-                num_of_len = len(self._nodes)
-                print("[DEBUG] the num of locke to release is {0}".format(num_of_len))
-            for semaphore in self.sort_finished_semaphore:
-                semaphore.release()
-            end = time.time()
-            if not self.first_run:
-                new_interval = interval - (end - start)
-                if new_interval > 0:
-                    util.sleep(new_interval)
-            else:
-                new_interval = 1 - (end - start)
-                if new_interval > 0:
-                    util.sleep(new_interval)
-                self.first_run = False
+                print("[DEBUG] node {0} missed the deadline {1} time(s)"
+                      .format(node.name, node.stale_ticks))
+            if node.stale_ticks % config.STALE_RESET == 0:
+                ret.append(node)
+        return ret
+
+    def tick_interval(self):
+        """
+        The seconds to the next tick, the first report has no delta,
+        so the second sample is taken quickly
+        """
+        if self.scheduler.tick is not None and not self.scheduler.window:
+            return 1
+        return self.scheduler.interval
+
+    def due_nodes(self, tick):
+        """
+        Return the nodes that should be collected at the tick, in the adaptive
+        mode a node keeps its last sample until its own interval passed
+        """
+        return [node for node in self.node_list if node.is_due(tick)]
+
+    def finish_tick(self, printer_queue):
+        """
+        All the due nodes are collected, check the overrun and publish the report
+        """
+        self.scheduler.end()
+        if config.DEBUG and self.scheduler.last_skipped:
+            print("[DEBUG] the collection overran {0} tick(s)"
+                  .format(self.scheduler.last_skipped))
+        self.publish_report(printer_queue)
 
     @property
     def name(self):
@@ -1022,66 +2057,175 @@ class LockSpace:
         return self._nodes.get(key, None)
 
     def name_to_locks(self, lock_name):
-        lock_on_cluster = []
-        for node in self.node_list:
-            lock = node[lock_name]
-            if lock is not None:
-                lock_on_cluster.append(lock)
-        return lock_on_cluster
+        """
+        Return the locks of the lock_name on different nodes, see lock_name_to_lock_set
+        """
+        return self.lock_name_to_lock_set(lock_name)._lock_list
 
     def lock_name_to_lock_set(self, lock_name):
         """
         According the lock_name generate a LockSet object,
-        collect the lock with para lock_name on different nodes,
-        and push them in a LockSet object. 
+        the locks of the lock_name on different nodes are read from the live lock
+        tables of the nodes, which the nodes may be updating meanwhile.
+        The report does not use it, it ranks active_lock_set() of the report barrier
         """
         lock_set = LockSet()
         for node in self.node_list:
-            lock = node[lock_name]
+            row = node.locks.row(lock_name)
+            if row is not None:
+                lock_set.append(LockView(node.locks, row))
+        return lock_set
+
+    def merge_nodes(self):
+        """
+        Merge the active locks and the lock types of every node,
+        it runs at the report barrier
+        """
+        lock_names = set()
+        lock_types = {}
+        active_locks = []
+        for node in self.node_list:
+            # a late node may replace its active locks meanwhile, the report uses these ones
+            active = node.active_locks
+            active_locks.append(active)
+            lock_names.update(active)
+            # a node that was not sampled again reports its last sample, its lock
+            # types as well as its active locks
+            for lock_type, count in node.type_counts.items():
+                lock_types[lock_type] = lock_types.get(lock_type, 0) + count
+        self._lock_names = lock_names
+        self._lock_types = lock_types
+        self._active_locks = active_locks
+
+    def active_lock_set(self, lock_name):
+        """
+        Generate the LockSet of the lock_name from the active locks
+        that the nodes had at the report barrier
+        """
+        lock_set = LockSet()
+        for active in self._active_locks:
+            lock = active.get(lock_name)
             if lock is not None:
                 lock_set.append(lock)
         return lock_set
 
-    def add_lock_name(self, lock_name):
+    def capture_summary(self):
         """
-        self._lock_names contains all the lock name on the lockspace(all the node),
-        This function update self._lock_names
+        Splice the tick of this sample, the window since the previous tick,
+        the skipped ticks and the capture window of every node relative to the tick
         """
-        with self._mutex:
-            self._lock_names.append(lock_name)
+        tick = self.scheduler.tick
+        if tick is None:
+            return ""
+        ret = "capture: {0} window {1}, skipped {2}".format(
+            time.strftime("%H:%M:%S", time.localtime(tick)),
+            "{0:.1f}s".format(self.scheduler.window) if self.scheduler.window else "-",
+            self.scheduler.skipped)
+        nodes = []
+        for node in self.node_list:
+            if node.capture_start is None or node.capture_end is None:
+                continue
+            node_name = util.get_hostname() if not node.name else node.name
+            if node.stale:
+                nodes.append("{0}{1} {2:+.2f}s~late".format(node_name, STALE_MARKER,
+                                                          node.capture_start - tick))
+                continue
+            nodes.append("{0} {1:+.2f}~{2:+.2f}s".format(node_name,
+                                                       node.capture_start - tick,
+                                                       node.capture_end - tick))
+        if nodes:
+            ret += "; " + ", ".join(nodes)
+        return ret
 
-    def reduce_lock_name(self):
+    def stale_summary(self):
         """
-        Delete duplicate locks in self._lock_names
+        Splice the nodes whose data is stale and the age of their last sample,
+        return "" if all the nodes are up to date
         """
-        self._lock_names = list(set(self._lock_names))
+        ret = []
+        for node in self.node_list:
+            if not node.stale:
+                continue
+            node_name = util.get_hostname() if not node.name else node.name
+            if node.last_tick is None or self.scheduler.tick is None:
+                age = "no data"
+            else:
+                age = "{0:.0f}s ago".format(self.scheduler.tick - node.last_tick)
+            ret.append("{0}{1} ({2})".format(node_name, STALE_MARKER, age))
+        if not ret:
+            return ""
+        return "stale: " + ", ".join(ret)
 
-    def add_lock_type(self, lock_name):
+    def reset_summary(self):
         """
-        self._lock_types contains all the lock types and the number of each type on the lockspace(all the node),
-        This function update self._lock_types
+        Splice the number of the lockres whose counters were reset on every node
+        in this tick, they are absorbed and have no delta in this sample,
+        return "" if no counter was reset
         """
-        with self._mutex:
-            if lock_name.lock_type in self._lock_types.keys():
-                self._lock_types[lock_name.lock_type] += 1
-            else:
-                self._lock_types[lock_name.lock_type] = 1
+        ret = []
+        for node in self.node_list:
+            if not node.resets or node.last_tick != self.scheduler.tick:
+                continue
+            node_name = util.get_hostname() if not node.name else node.name
+            ret.append("{0} {1}".format(node_name, node.resets))
+        if not ret:
+            return ""
+        return "resets: " + ", ".join(ret)
+
+    def interval_summary(self):
+        """
+        Splice the current interval of every node in the adaptive mode,
+        return "" if all the nodes use the same fixed interval
+        """
+        ret = []
+        for node in self.node_list:
+            if node.interval is None:
+                continue
+            node_name = util.get_hostname() if not node.name else node.name
+            ret.append("{0} {1}s".format(node_name, node.interval.interval))
+        if not ret:
+            return ""
+        return "interval: " + ", ".join(ret)
 
+    def transport_summary(self):
+        """
+        Splice the bytes received from every remote node in this session and
+        the bytes after decoding them, return "" if nothing crossed the network
+        """
+        ret = []
+        for node in self.node_list:
+            bytes_on_wire, bytes_decoded, codec = node.transport_info()
+            if not bytes_on_wire:
+                continue
+            node_str = "{0} {1}/{2}".format(node.name,
+                                            util.human_readable_size(bytes_on_wire),
+                                            util.human_readable_size(bytes_decoded))
+            if codec and codec != "none":
+                node_str += "({0})".format(codec)
+            ret.append(node_str)
+        if not ret:
+            return ""
+        return "transport(wire/decoded): " + ", ".join(ret)
 
     def report_once(self):
+        """
+        Merge the samples of the nodes and rank the lockres that have a key index
+        on any node, the nodes that were not collected in this tick keep their last sample
+        """
+        self.merge_nodes()
         if config.DEBUG:
-            print("[DEBUG] in LockSpace.report_once, befor reduce_lock_name, "
-                  "the length of lock_name is {0}"
-                  .format(len(self._lock_names)))
-        self.reduce_lock_name()
-        if config.DEBUG:
-            print("[DEBUG] in LockSpace.report_once, after reduce_lock_name, "
-                  "the length of lock_name is {0}"
+            print("[DEBUG] in LockSpace.report_once, {0} lock names are ranked"
                   .format(len(self._lock_names)))
-        lock_names = self._lock_names
+            for node in self.node_list:
+                print("[DEBUG] node {0} tracks {1} lockres, {2} are untracked, "
+                      "evicted {3} idle and {4} lru, {5} lock names are decoded, "
+                      "{6} are evicted"
+                      .format(node.name, len(node.locks), node.untracked_count,
+                              node.evicted_idle, node.evicted_lru,
+                              len(node.name_cache), node.name_cache.evicted))
         lsg = LockSetGroup(self._max_sys_inode_num, self)
-        for lock_name in lock_names:
-            lock_set = self.lock_name_to_lock_set(lock_name)
+        for lock_name in self._lock_names:
+            lock_set = self.active_lock_set(lock_name)
             # change append method
             lsg.append(lock_set)
 
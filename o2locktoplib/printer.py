@@ -34,7 +34,10 @@ class Printer():
             if rows == 0:
                 print(self.content[self.display_mode])
             else:
-                for i in self.content[self.display_mode].split('\n')[:rows+4]:
+                lines = self.content[self.display_mode].split('\n')
+                # the header ends with an empty line and the title line
+                header_rows = lines.index('') + 2 if '' in lines else 4
+                for i in lines[:rows+header_rows]:
                     print(i)
             # Because in some case(such as unix output redirect), the stdout device is not
             # the screen, it maybe a file or other process, so we must flush the output in 
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+"""
+The sampling scheduler of o2locktop.
+All the nodes are collected at the same wall-clock ticks, which are aligned to
+the interval (e.g. :00, :05, :10 with a 5 seconds interval), so the samples of
+different nodes refer to the same time window.
+"""
+
+import math
+import time
+
+
+class Scheduler(object):
+    """
+    Compute the aligned ticks and detect the collections that overrun them.
+    If a collection finishes after the next tick, the ticks in between are
+    skipped, and the next sample is merged into a longer window
+    """
+    def __init__(self, interval, clock=None):
+        self.interval = interval
+        self._clock = clock if clock is not None else time.time
+        # the tick that is being collected or was collected last
+        self.tick = None
+        # the seconds between the last two ticks, 0 before the second tick
+        self.window = 0
+        # the ticks skipped by the last collection and in total
+        self.last_skipped = 0
+        self.skipped = 0
+
+    def next_tick(self, now, interval=None):
+        """
+        Return the first tick after now that is aligned to the interval
+        """
+        interval = interval if interval is not None else self.interval
+        return (math.floor(now / interval) + 1) * interval
+
+    def delay(self, interval=None):
+        """
+        Return the next tick and the seconds to wait for it,
+        the first collection fires at once
+        """
+        now = self._clock()
+        if self.tick is None:
+            return now, 0
+        tick = self.next_tick(now, interval)
+        return tick, tick - now
+
+    def wait(self, interval=None):
+        """
+        Sleep until the next tick, and begin it
+        """
+        tick, delay = self.delay(interval)
+        if delay > 0:
+            time.sleep(delay)
+        self.begin(tick)
+        return tick
+
+    def begin(self, tick):
+        """
+        The collection of the tick begins
+        """
+        if self.tick is not None:
+            self.window = tick - self.tick
+        self.tick = tick
+
+    def end(self):
+        """
+        The collection of the current tick finished,
+        count the ticks that passed while it was running
+        """
+        self.last_skipped = 0
+        if self.tick is None:
+            return 0
+        overrun = self._clock() - self.tick
+        if overrun >= self.interval:
+            self.last_skipped = int(overrun // self.interval)
+            self.skipped += self.last_skipped
+        return self.last_skipped
+
+class AdaptiveInterval(object):
+    """
+    Tune the sampling interval of one node between min_interval and max_interval.
+    The interval shrinks when many lockres changed in the last sample, grows when
+    the node is quiet, and never lets the collection take more than 1/COST_RATIO
+    of the interval. The interval is always a multiple of min_interval, so the node
+    is still collected at the ticks of the scheduler
+    """
+    COST_RATIO = 10
+    # the fraction of the changed lockres above which the interval is halved,
+    # and below which it is doubled
+    HIGH_CHURN = 0.2
+    LOW_CHURN = 0.02
+
+    def __init__(self, min_interval, max_interval):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min_interval
+
+    def update(self, cost, churn):
+        """
+        Compute the next interval from the seconds the last collection took
+        and the fraction of the lockres that changed in it
+        """
+        interval = self.interval
+        if churn >= AdaptiveInterval.HIGH_CHURN:
+            interval = interval / 2.0
+        elif churn <= AdaptiveInterval.LOW_CHURN:
+            interval = interval * 2
+        interval = max(interval, cost * AdaptiveInterval.COST_RATIO)
+        steps = int(math.ceil(interval / float(self.min_interval)))
+        max_steps = int(self.max_interval // self.min_interval)
+        self.interval = max(1, min(steps, max_steps)) * self.min_interval
+        return self.interval
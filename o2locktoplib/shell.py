@@ -26,6 +26,7 @@ If you need to extend the behavior, you can also use the ``Shell`` object::
 ['Hello, world!']
 
 """
+import os
 import shlex
 import subprocess
 
@@ -69,13 +70,19 @@ class Shell(object):
     Optionally accepts a ``strip_empty`` parameter, which should be a boolean.
     If set to ``True``, only non-empty lines from ``Shell.output`` or
     ``Shell.errors`` will be returned. (Default: ``True``)
+
+    Optionally accepts a ``stream`` parameter, which should be a boolean.
+    If set to ``True``, the output is not recorded, it is read line by line
+    with ``Shell.iter_output`` while the command is running, and the stderr
+    is dropped. (Default: ``False``)
     """
     def __init__(self, has_input=False, record_output=True, record_errors=True,
-                 strip_empty=True):
+                 strip_empty=True, stream=False):
         self.has_input = has_input
         self.record_output = record_output
         self.record_errors = record_errors
         self.strip_empty = strip_empty
+        self.stream = stream
 
         self.last_command = ''
         self.line_breaks = '\n'
@@ -159,18 +166,63 @@ class Shell(object):
         if self.has_input:
             kwargs['stdin'] = subprocess.PIPE
 
-        self._popen = subprocess.Popen(
-            command_bits,
-            shell=True,
-            **kwargs
-        )
+        if self.stream:
+            # nobody reads the stderr while streaming, a full pipe would block the command
+            with open(os.devnull, 'w') as devnull:
+                kwargs['stderr'] = devnull
+                self._popen = subprocess.Popen(
+                    command_bits,
+                    shell=True,
+                    **kwargs
+                )
+        else:
+            self._popen = subprocess.Popen(
+                command_bits,
+                shell=True,
+                **kwargs
+            )
         self.pid = self._popen.pid
 
-        if not self.has_input:
+        if not self.has_input and not self.stream:
             self._communicate()
 
         return self
 
+    def iter_output(self):
+        """
+        Yields the lines of the output one by one while the command is running,
+        only one line is held in memory at a time.
+
+        This needs to be used in conjunction with the ``stream=True``
+        parameter. If the caller stops the iteration early, the command is killed.
+
+        Example::
+
+        >>> from shell import Shell
+        >>> sh = Shell(stream=True)
+        >>> for line in sh.run('ls ~').iter_output():
+        ...     print line
+        'hello.txt'
+
+        """
+        if not self._popen:
+            raise MissingCommandException(
+                "No command has been provided. Please call ``run`` first."
+            )
+
+        finished = False
+        try:
+            for line in iter(self._popen.stdout.readline, ''):
+                line = line.rstrip(self.line_breaks)
+                if line or not self.strip_empty:
+                    yield line
+            finished = True
+        finally:
+            if not finished and self._popen.poll() is None:
+                self._popen.kill()
+            self._popen.stdout.close()
+            self.code = self._popen.wait()
+
     def write(self, the_input):
         """
         If you're working with an interactive process, sends that input to
@@ -12,19 +12,101 @@ import sys
 import signal
 import socket
 import platform
+import shutil
+import subprocess
+import tempfile
+try:
+    from shlex import quote as shell_quote
+except ImportError:
+    # python2
+    from pipes import quote as shell_quote
 from o2locktoplib import config
 from o2locktoplib import shell
 
 PY2 = (sys.version_info[0] == 2)
 LINUX = True if "linux" in platform.system().lower() else False
 
+# the directory of the ssh control sockets, the nodes and the pid of the process
+# that opened them, None means the ssh connections are not multiplexed
+_SSH_CONTROL_DIR = None
+_SSH_CONTROL_NODES = []
+_SSH_CONTROL_PID = None
+
+def ssh_options(master="no"):
+    """
+    Return the ssh options that make the command reuse the control connection
+    of the node, an empty list if the connections are not multiplexed.
+    Only open_ssh_control creates the master, the other commands never become
+    the master, if the master is gone they fall back to a plain connection
+    """
+    if _SSH_CONTROL_DIR is None:
+        return []
+    # %C is a hash of the connection, it keeps the socket path short and plain
+    return ["-oControlMaster={0}".format(master),
+            "-oControlPath={0}".format(os.path.join(_SSH_CONTROL_DIR, "%C"))]
+
+def ssh_prefix(ip_addr, options=None, user="root"):
+    """Return the ssh command prefix to run a command on the node, "" for the local node
+    Parameters:
+        ip_addr(str): The node's ip, None means the local node
+        options(list): The extra ssh options
+        user(str): The username for the remote node
+    """
+    if not ip_addr:
+        return ""
+    args = ["ssh"] + ssh_options() + (options or []) + ["{0}@{1}".format(user, ip_addr)]
+    return " ".join(shell_quote(i) for i in args) + " "
+
+def _ssh_control_cmds(nodes, master, *args):
+    """
+    Run one ssh control command for every node in parallel and wait for all of them
+    """
+    processes = []
+    with open(os.devnull, "w") as devnull:
+        for node in nodes:
+            cmd = ["ssh"] + ssh_options(master) + list(args) + ["root@{0}".format(node)]
+            processes.append(subprocess.Popen(cmd, stdin=devnull, stdout=devnull,
+                                              stderr=devnull))
+    for process in processes:
+        process.wait()
+
+def open_ssh_control(nodes):
+    """Open one multiplexed ssh control connection to every node in parallel,
+    the following ssh commands to the nodes reuse them instead of a new handshake.
+    If a node can not be connected, the commands to it fall back to plain ssh
+    Parameters:
+        nodes(list): The node list of the cluster
+    """
+    global _SSH_CONTROL_DIR, _SSH_CONTROL_NODES, _SSH_CONTROL_PID
+    if not config.SSH_MULTIPLEX or not nodes or _SSH_CONTROL_DIR is not None:
+        return
+    _SSH_CONTROL_DIR = tempfile.mkdtemp(prefix="o2locktop-ssh-")
+    _SSH_CONTROL_NODES = list(nodes)
+    _SSH_CONTROL_PID = os.getpid()
+    # -M: be the master, -N: no command, -f: go background once it is connected
+    _ssh_control_cmds(nodes, "yes", "-oBatchMode=yes", "-oConnectTimeout=6", "-MNf")
+
+def close_ssh_control():
+    """
+    Tear down the control connections opened by open_ssh_control,
+    only the process that opened them does it
+    """
+    global _SSH_CONTROL_DIR, _SSH_CONTROL_NODES, _SSH_CONTROL_PID
+    if _SSH_CONTROL_DIR is None or _SSH_CONTROL_PID != os.getpid():
+        return
+    _ssh_control_cmds(_SSH_CONTROL_NODES, "no", "-Oexit")
+    shutil.rmtree(_SSH_CONTROL_DIR, ignore_errors=True)
+    _SSH_CONTROL_DIR = None
+    _SSH_CONTROL_NODES = []
+    _SSH_CONTROL_PID = None
+
 def check_support_debug_v4_and_get_interval(lockspace, ip_addr):
     """Check if the node support ocfs2 debug information version4
     Parameters:
         lockspace(str): the ocfs2 file system uuid
         ip_addr(str): The node's ip that to be tested
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ''
+    prefix = ssh_prefix(ip_addr)
     cmd = "cat /sys/kernel/debug/ocfs2/{lockspace}/locking_filter".format(
         lockspace=lockspace)
     shell_obj = shell.shell(prefix + cmd)
@@ -38,7 +120,7 @@ def set_debug_v4_interval(lockspace, ip_addr, interval=0):
         ip_addr(str): The node's ip that to be tested
         interval(int): The ocfs2 filter interval(will be wrote to locking_filter)
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ''
+    prefix = ssh_prefix(ip_addr)
     if ip_addr:
         cmd = r"echo {interval} \> /sys/kernel/debug/ocfs2/{lockspace}/locking_filter".format(
             lockspace=lockspace,
@@ -56,7 +138,7 @@ def is_passwdless_ssh_set(ip_addr, user="root"):
         ip_addr(str): The node's ip that to be tested
         user(str): The username for the remote node
     """
-    prefix = "ssh -oBatchMode=yes {user}@{ip_addr} ".format(user=user, ip_addr=ip_addr) if ip_addr else ''
+    prefix = ssh_prefix(ip_addr, ["-oBatchMode=yes"], user=user)
     shell_obj = shell.shell(prefix + "uname")
     ret = shell_obj.output()
     return len(ret) != 0
@@ -65,7 +147,7 @@ def get_remote_path(ip_addr):
     """
     Get the remote node's environmet variable PATH
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ''
+    prefix = ssh_prefix(ip_addr)
     cmd = "echo '$PATH'"
     shell_obj = shell.shell(prefix + cmd)
     ret = shell_obj.output()
@@ -76,7 +158,7 @@ def get_remote_cmd_list(ip_addr):
     Split the remote node's environmet variable PATH to list array
     """
     path = get_remote_path(ip_addr)
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ''
+    prefix = ssh_prefix(ip_addr)
     ret = []
     #cmd = 'for i in `echo $PATH|sed "s/:/ /g"`; do ls $i | grep -v "^d"; done'
     if not path:
@@ -129,7 +211,7 @@ def uname_r(ip_addr=None):
     """
     Get the result of command "uname -r" on remote node
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
+    prefix = ssh_prefix(ip_addr)
     cmd = "uname -r"
     shell_obj = shell.shell(prefix + cmd)
     ret = shell_obj.output()
@@ -140,7 +222,7 @@ def is_kernel_ocfs2_fs_stats_enabled(ip_addr=None):
     Check if the CONFIG_OCFS2_FS_STATS macro is set on remote node
     """
     uname = uname_r(ip_addr)
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
+    prefix = ssh_prefix(ip_addr)
     cmd = "grep \"CONFIG_OCFS2_FS_STATS=y\" /boot/config-{uname}".format(
         uname=" ".join(uname))
     shell_obj = shell.shell(prefix + cmd)
@@ -159,19 +241,44 @@ def prompt_sshkey_copy_id():
     return answer in ['Y', 'y']
 
 
+def locking_state_path(lockspace):
+    """
+    Return the debugfs path of the locking_state according to the fs uuid(lockspace)
+    """
+    return "/sys/kernel/debug/ocfs2/{lockspace}/locking_state".format(
+        lockspace=lockspace)
+
+def get_one_cat_cmd(lockspace, ip_addr=None):
+    """
+    Return the command that cats the locking_state according to the fs uuid(lockspace) and ip
+    """
+    prefix = ssh_prefix(ip_addr)
+    return prefix + "cat {0}".format(locking_state_path(lockspace))
+
 def get_one_cat(lockspace, ip_addr=None):
     """
     Cat the locking_state according to the fs uuid(lockspace) and ip
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
-    cmd = "cat /sys/kernel/debug/ocfs2/{lockspace}/locking_state".format(
-        lockspace=lockspace)
-    shell_obj = shell.shell(prefix + cmd)
+    cmd = get_one_cat_cmd(lockspace, ip_addr)
+    shell_obj = shell.shell(cmd)
     ret = shell_obj.output()
     if not ret and config.DEBUG:
         eprint("[DEBUG] {cmd} on {ip_addr} return len=0".format(cmd=cmd, ip_addr=ip_addr))
     return ret
 
+def iter_one_cat(lockspace, ip_addr=None):
+    """
+    Cat the locking_state according to the fs uuid(lockspace) and ip,
+    yield the lines as they arrive from the pipe instead of collecting the whole output
+    """
+    cmd = get_one_cat_cmd(lockspace, ip_addr)
+    count = 0
+    for line in shell.Shell(stream=True).run(cmd).iter_output():
+        count += 1
+        yield line
+    if not count and config.DEBUG:
+        eprint("[DEBUG] {cmd} on {ip_addr} return len=0".format(cmd=cmd, ip_addr=ip_addr))
+
 # fs_stat
 """
     Device => Id: 253,16  Uuid: 7635D31F539A483C8E2F4CC606D5D628  Gen: 0x6434F530  Label:
@@ -202,7 +309,7 @@ def major_minor_to_device_path(major, minor, ip_addr=None):
     """
     Trans the major,minor pair to the device path
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
+    prefix = ssh_prefix(ip_addr)
     cmd = "lsblk -o MAJ:MIN,KNAME,MOUNTPOINT -l | grep '{major}:{minor}'".format(
         major=major, minor=minor)
     output = shell.shell(prefix + cmd).output()
@@ -231,7 +338,7 @@ def lockspace_to_device(uuid, ip_addr=None):
     """
     cmd = "cat /sys/kernel/debug/ocfs2/{uuid}/fs_state | grep 'Device =>'"\
             .format(uuid=uuid)
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
+    prefix = ssh_prefix(ip_addr)
     shell_obj = shell.shell(prefix + cmd)
     output = shell_obj.output()
     if not output:
@@ -274,7 +381,7 @@ def get_dlm_lockspaces(ip_addr=None):
     """
     Get the dlm lockspace(fs uuid) of remote ip
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
+    prefix = ssh_prefix(ip_addr)
     cmd = "dlm_tool ls | grep ^name"
     shell_obj = shell.shell(prefix + cmd)
     output = shell_obj.output()
@@ -288,7 +395,7 @@ def get_dlm_lockspace_mp(ip_addr, mount_point):
     According the mount point get the lockspace info of remote host
     and check if the ssh-copy-id is set to the remote node
     """
-    prefix = "ssh -oBatchMode=yes -oConnectTimeout=6 root@{0} ".format(ip_addr) if ip_addr else ""
+    prefix = ssh_prefix(ip_addr, ["-oBatchMode=yes", "-oConnectTimeout=6"])
     cmd = "o2info --volinfo {0} | grep UUID".format(mount_point)
     shell_obj = shell.shell(prefix + cmd)
     output = shell_obj.output()
@@ -316,7 +423,7 @@ def get_dlm_lockspace_max_sys_inode_number(ip_addr, mount_point):
     if not uuid:
         eprint("\no2locktop: error: can't find the mount point: {0}, please cheack and retry\n"
                .format(mount_point))
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
+    prefix = ssh_prefix(ip_addr)
     cmd = "blkid  | grep {0}".format(uuid)
     output = shell.shell(prefix + cmd).output()
 
@@ -327,7 +434,7 @@ def get_dlm_lockspace_max_sys_inode_number(ip_addr, mount_point):
     else:
         return None
     if ip_addr != None:
-        prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
+        prefix = ssh_prefix(ip_addr)
         cmd = "'debugfs.ocfs2 -R \"ls //\" {0}'".format(filesystem)
         output = shell.shell(prefix + cmd).output()
     else:
@@ -347,7 +454,7 @@ def device_to_mount_points(device, ip_addr=None):
     According the device get the mount point, the fs on the device must be ocfs2
     /dev/sda => /mnt/ocfs2
     """
-    prefix = "ssh root@{0} ".format(ip_addr) if ip_addr else ""
+    prefix = ssh_prefix(ip_addr)
     cmd = "mount | grep 'type ocfs2'"
     shell_obj = shell.shell(prefix + cmd)
     output = shell_obj.output()
@@ -362,6 +469,18 @@ def device_to_mount_points(device, ip_addr=None):
             ret.append(i[2])
     return list(set(ret))
 
+def human_readable_size(size):
+    """
+    Trans the number of bytes to the human readable format, e.g 1536 => 1.5K
+    """
+    for unit in ["B", "K", "M", "G"]:
+        if size < 1024 or unit == "G":
+            break
+        size /= 1024.0
+    if unit == "B":
+        return "{0}{1}".format(int(size), unit)
+    return "{0:.1f}{1}".format(size, unit)
+
 def clear_screen():
     """
     Clear the screen
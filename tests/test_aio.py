@@ -0,0 +1,88 @@
+"""
+Unit test for aio.py
+"""
+import sys
+sys.path.append("../")
+import asyncio
+import pytest
+from o2locktoplib import aio
+from o2locktoplib import cat
+from o2locktoplib import util
+import config
+
+@pytest.fixture(params=[('local', aio.AsyncCat),
+                        ('ssh', aio.AsyncSshCat),
+                        ('stream', aio.AsyncSshStreamCat),
+                        ('delta', aio.AsyncSshAgentCat)])
+def mode(request):
+    return request.param
+
+def test_gen_async_cat(mode):
+    which, async_class = mode
+    if which == 'local':
+        cat_obj = cat.gen_cat(which, config.lockspace)
+    else:
+        cat_obj = cat.gen_cat(which, config.lockspace, '127.0.0.1')
+    assert type(aio.gen_async_cat(cat_obj)) is async_class, "gen_async_cat test failed"
+
+def test_async_local_cat(tmp_path, monkeypatch):
+    state = tmp_path / "locking_state"
+    state.write_text("line1\nline2\n\nline3\n")
+    monkeypatch.setattr(util, "locking_state_path", lambda lockspace: str(state))
+    async_cat = aio.gen_async_cat(cat.LocalCat(config.lockspace))
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(async_cat.get()) == ["line1", "line2", "line3"],\
+        "AsyncCat get test failed"
+    finally:
+        loop.close()
+
+def test_async_stream_cat():
+    async_cat = aio.gen_async_cat(cat.SshStreamCat(config.lockspace, '127.0.0.1'))
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(async_cat.get()), "AsyncSshStreamCat get test failed"
+        assert async_cat.is_connected(), "AsyncSshStreamCat get test failed"
+    finally:
+        async_cat.close()
+        loop.close()
+
+def test_line_feed():
+    feed = aio.LineFeed()
+    for line in ("line1", "line2", "line3"):
+        feed.append(line)
+    feed.close()
+    assert len(feed) == 3, "LineFeed test failed"
+    assert list(feed) == ["line1", "line2", "line3"], "LineFeed test failed"
+    feed = aio.LineFeed()
+    feed.append("line1")
+    feed.close(IOError("channel closed"))
+    with pytest.raises(IOError):
+        list(feed)
+
+def test_line_feed_drain(monkeypatch):
+    monkeypatch.setattr(aio.LineFeed, "CHUNK", 2)
+    monkeypatch.setattr(aio.LineFeed, "MAX_CHUNKS", 2)
+    loop = asyncio.new_event_loop()
+
+    async def feed_lines():
+        feed = aio.LineFeed()
+        full = [feed.append("line{0}".format(i)) for i in range(4)]
+        assert full == [False, False, False, True], "LineFeed drain test failed"
+        # nothing parses the feed, the reader waits
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(feed.drain(), 0.1)
+        # the parse takes a chunk
+        parse = loop.run_in_executor(None, next, iter(feed))
+        parse.add_done_callback(feed.parse_done)
+        await asyncio.wait_for(feed.drain(), 5)
+        assert await parse == "line0", "LineFeed drain test failed"
+        # the parse stopped, the reader does not wait for it
+        assert not feed.append("line4") and not feed.append("line5"),\
+        "LineFeed drain test failed"
+        await asyncio.wait_for(feed.drain(), 5)
+
+    try:
+        loop.run_until_complete(feed_lines())
+    finally:
+        loop.close()
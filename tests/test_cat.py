@@ -39,3 +39,96 @@ def test_cat(lockspace, mode):
         else:
             cat_with_mode = cat.SshCat(lockspace, '127.0.0.1')
             assert cat.gen_cat('local', lockspace).get(), "test SshCat faild"
+
+def test_gen_cat_stream(lockspace):
+    cat_with_mode = cat.gen_cat('stream', lockspace, '127.0.0.1')
+    assert isinstance(cat_with_mode, cat.SshStreamCat), "test gen_cat stream mode faild"
+    # the ssh channel is opened lazily by the first get()
+    assert not cat_with_mode.is_connected(), "test SshStreamCat faild"
+
+def test_stream_cat(lockspace):
+    cat_with_mode = cat.SshStreamCat(lockspace, '127.0.0.1')
+    first = cat_with_mode.get()
+    assert first, "test SshStreamCat faild"
+    assert cat_with_mode.is_connected(), "test SshStreamCat faild"
+    # the second snapshot must reuse the same channel
+    pid = cat_with_mode._process.pid
+    assert cat_with_mode.get(), "test SshStreamCat faild"
+    assert cat_with_mode._process.pid == pid, "test SshStreamCat faild"
+    cat_with_mode.close()
+    assert not cat_with_mode.is_connected(), "test SshStreamCat faild"
+
+def test_gen_cat_delta(lockspace):
+    cat_with_mode = cat.gen_cat('delta', lockspace, '127.0.0.1')
+    assert isinstance(cat_with_mode, cat.SshAgentCat), "test gen_cat delta mode faild"
+    assert not cat_with_mode.is_connected(), "test SshAgentCat faild"
+
+def test_agent_cat(lockspace):
+    cat_with_mode = cat.SshAgentCat(lockspace, '127.0.0.1')
+    # the first snapshot is always the whole locking_state
+    first = cat_with_mode.get()
+    assert first and not isinstance(first, cat.DeltaSnapshot), "test SshAgentCat faild"
+    second = cat_with_mode.get()
+    assert isinstance(second, cat.DeltaSnapshot), "test SshAgentCat faild"
+    assert len(second) <= len(first), "test SshAgentCat faild"
+    cat_with_mode.close()
+
+def test_agent_cat_offered_codecs(lockspace):
+    assert cat.SshAgentCat(lockspace, '127.0.0.1', compress='none')._offered_codecs() == 'none'
+    assert cat.SshAgentCat(lockspace, '127.0.0.1', compress='zlib')._offered_codecs() == 'zlib'
+    assert cat.SshAgentCat(lockspace, '127.0.0.1', compress='lzma')._offered_codecs() == \
+           'lzma,zlib', "test SshAgentCat codec negotiation faild"
+    for codec in ['zlib', 'lzma']:
+        assert cat.DECOMPRESS[codec](__import__(codec).compress(b"0x4 M0000")) == b"0x4 M0000"
+
+def test_local_cat_chunked_read(tmp_path, monkeypatch):
+    lines = ["0x4\tM{0:030d}\t{1}".format(i, "0x0\t" * (i % 90)) for i in range(2000)]
+    state = tmp_path / "locking_state"
+    state.write_text("\n".join(lines) + "\n\n")
+    monkeypatch.setattr(util, "locking_state_path", lambda lockspace: str(state))
+    monkeypatch.setattr(cat.LocalCat, "CHUNK_SIZE", 256)
+    cat_with_mode = cat.LocalCat("lockspace")
+    assert list(cat_with_mode.get()) == lines, "test LocalCat chunked read faild"
+    # the buffer is given back and reused by the next get()
+    assert len(cat_with_mode._buffers) == 1, "test LocalCat buffer reuse faild"
+    assert list(cat_with_mode.get()) == lines, "test LocalCat chunked read faild"
+    assert len(cat_with_mode._buffers) == 1, "test LocalCat buffer reuse faild"
+    monkeypatch.setattr(util, "locking_state_path", lambda lockspace: str(tmp_path / "none"))
+    assert cat_with_mode.get() == [], "test LocalCat missing file faild"
+
+def test_stream_cat_abandoned_reply(tmp_path, monkeypatch):
+    state = tmp_path / "locking_state"
+    state.write_text("line1\nline2\nline3\n")
+    monkeypatch.setattr(util, "locking_state_path", lambda lockspace: str(state))
+    cat_with_mode = cat.SshStreamCat("lockspace", "node1")
+    # run the remote loop locally, the first channel breaks before its reply
+    channels = []
+    def command():
+        channels.append(cat_with_mode._remote_script())
+        return ["sh", "-c", "read _" if len(channels) == 1 else channels[-1]]
+    monkeypatch.setattr(cat_with_mode, "command", command)
+    try:
+        assert list(cat_with_mode.get()) == ["line1", "line2", "line3"],\
+            "test SshStreamCat read retry faild"
+        assert len(channels) == 2, "test SshStreamCat read retry faild"
+        reply = cat_with_mode.get()
+        assert next(reply) == "line1", "test SshStreamCat abandoned reply faild"
+        # the rest of the abandoned reply is not read as the next one
+        assert list(cat_with_mode.get()) == ["line1", "line2", "line3"],\
+            "test SshStreamCat abandoned reply faild"
+        assert len(channels) == 3, "test SshStreamCat abandoned reply faild"
+        # the abandoned reply does not drop the new channel
+        with pytest.raises(IOError):
+            list(reply)
+        assert cat_with_mode.is_connected(), "test SshStreamCat abandoned reply faild"
+    finally:
+        cat_with_mode.close()
+
+def test_ssh_cat_bytes(monkeypatch):
+    monkeypatch.setattr(util, "iter_one_cat",
+                        lambda lockspace, ip_addr=None: iter(["line1", "line22"]))
+    cat_with_mode = cat.SshCat("lockspace", '127.0.0.1')
+    assert list(cat_with_mode.get()) == ["line1", "line22"], "test SshCat bytes faild"
+    # the newlines that iter_one_cat strips are counted too
+    assert cat_with_mode.bytes_on_wire == 13 and cat_with_mode.bytes_decoded == 13,\
+        "test SshCat bytes faild"
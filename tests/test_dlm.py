@@ -6,6 +6,7 @@ import os
 import pytest
 import config
 sys.path.append("../")
+from o2locktoplib import cat
 from o2locktoplib import dlm
 from o2locktoplib import util
 import check_env
@@ -51,6 +52,21 @@ def test_class_lockname():
     lockname1 = dlm.LockName("N00000000000000050000c603")
     assert lockname == lockname1, "LockName __eq__ test failed"
 
+def test_lock_name_cache():
+    """
+    Test the LockNameCache class in dlm.py
+    """
+    cache = dlm.LockNameCache()
+    entry = cache.get("M00000000000000000000056434f530")
+    assert entry == ("M", 5, "6434f530", dlm.LockName("M00000000000000000000056434f530").short_name),\
+        "LockNameCache get test failed"
+    assert cache.get("M00000000000000000000056434f530") is entry, "LockNameCache get test failed"
+    cache.get("N00000000000000050000c603")
+    assert len(cache) == 2, "LockNameCache get test failed"
+    cache.evict("M00000000000000000000056434f530")
+    cache.evict("M00000000000000000000056434f530")
+    assert len(cache) == 1 and cache.evicted == 1, "LockNameCache evict test failed"
+
 def test_class_shot():
     """
     Test the Shot class in dlm.py
@@ -64,7 +80,26 @@ def test_class_shot():
     assert shot.legal(), "got an ilegal shot"
     assert shot.inode_num == 50690, "Shot inode number test failed"
     assert shot.lock_type == "N", "Shot lock_type test failed"
+    # the lvb and the raw line are dropped by default
+    with pytest.raises(AttributeError):
+        shot.lvb_64B
+    with pytest.raises(AttributeError):
+        shot.source
+    # only the fields of the projection are extracted
+    assert shot.lock_total_prmode == 21937, "Shot projection test faild"
+    with pytest.raises(AttributeError):
+        shot.lock_max_exmode
+    shot = dlm.Shot(LOCKING_STATE_STR0, projection=dlm.Projection(["lock_refresh", "l_requested"]))
+    assert shot.name == dlm.LockName("N00000000000000050000c602"), "Shot projection test faild"
+    assert shot.lock_refresh == 0 and shot.l_requested == 3, "Shot projection test faild"
+    with pytest.raises(AttributeError):
+        shot.lock_num_prmode
+    with pytest.raises(ValueError):
+        dlm.Projection(["lvb_64B"])
+    with pytest.raises(ValueError):
+        dlm.Shot(LOCKING_STATE_STR0[:200])
 
+    shot = dlm.Shot(LOCKING_STATE_STR0, raw=True)
 
     assert shot.debug_ver == 4
     assert shot.name == dlm.LockName("N00000000000000050000c602")
@@ -74,7 +109,7 @@ def test_class_shot():
     assert shot.l_unlock_action == '0x0'
     assert shot.l_ro_holders == '0'
     assert shot.l_ex_holders == '0'
-    assert shot.l_requested == '3'
+    assert shot.l_requested == 3
     assert shot.l_blocking == '-1'
     assert shot.lvb_64B == '0x00x00x00x00x00x00x00x00x00x00x00x0'\
                            '0x00x00x00x00x00x00x00x00x00x00x00x0'\
@@ -82,17 +117,166 @@ def test_class_shot():
                            '0x00x00x00x00x00x00x00x00x00x00x00x0'\
                            '0x00x00x00x00x00x00x00x00x00x00x00x0'\
                            '0x00x00x00x0'
-    assert shot.lock_num_prmode == '1'
-    assert shot.lock_num_exmode == '0'
-    assert shot.lock_num_prmode_failed == '0'
-    assert shot.lock_num_exmode_failed == '0'
-    assert shot.lock_total_prmode == '21937'
-    assert shot.lock_total_exmode == '0'
-    assert shot.lock_max_exmode == '0'
-    assert shot.lock_refresh == '0'
+    assert shot.lock_num_prmode == 1
+    assert shot.lock_num_exmode == 0
+    assert shot.lock_num_prmode_failed == 0
+    assert shot.lock_num_exmode_failed == 0
+    assert shot.lock_total_prmode == 21937
+    assert shot.lock_total_exmode == 0
+    assert shot.lock_max_exmode == 0
+    assert shot.lock_refresh == 0
 
 # In this test, I insert two diff kind of lock in Lock object
 # and it should throw AssertionError
+def test_debug_format():
+    """
+    Test the debug format registry and the compiled projection in dlm.py
+    """
+    v3_line = "\t".join(LOCKING_STATE_STR0.split("\t")[:83]).replace("0x4", "0x3", 1)
+    assert dlm.DEBUG_FORMATS[3].columns == 83, "debug format test faild"
+    assert dlm.DEBUG_FORMATS[4].columns == 86, "debug format test faild"
+    parser = dlm.Shot.stat_projection.compile(4)
+    assert parser is dlm.Shot.stat_projection.compile(4), "compile projection test faild"
+    shot = dlm.Shot(LOCKING_STATE_STR0, projection=parser)
+    assert shot.debug_ver == 4 and shot.lock_total_prmode == 21937, "compile projection test faild"
+    with pytest.raises(dlm.VersionMismatch):
+        dlm.Shot(v3_line, projection=parser)
+    shot = dlm.Shot(v3_line, projection=dlm.Shot.stat_projection.compile(3))
+    assert shot.debug_ver == 3 and shot.lock_wait == 0, "compile projection test faild"
+    with pytest.raises(ValueError):
+        dlm.Shot.stat_projection.compile(99)
+
+    # a new version only needs to be registered
+    dlm.register_debug_format(5, dlm.DEBUG_FORMAT_V4 + (("lock_new_field", 1),))
+    try:
+        v5_line = LOCKING_STATE_STR0.strip().replace("0x4", "0x5", 1) + "\t7"
+        shot = dlm.Shot(v5_line)
+        assert shot.debug_ver == 5 and shot.lock_total_prmode == 21937, "debug format test faild"
+        assert dlm.Shot(v5_line, raw=True).lock_new_field == "7", "debug format test faild"
+    finally:
+        del dlm.DEBUG_FORMATS[5]
+
+def test_lock_table():
+    """
+    Test the LockTable and LockView classes in dlm.py
+    """
+    table = dlm.LockTable(None)
+    shot1 = dlm.Shot(LOCKING_STATE_STR1)
+    shot2 = dlm.Shot(LOCKING_STATE_STR2)
+    row = table.add(shot1.name)
+    table.append(row, shot1, hash(LOCKING_STATE_STR1))
+    assert len(table) == 1 and shot1.name in table, "LockTable add test faild"
+    assert table.is_same_line(row, hash(LOCKING_STATE_STR1)), "LockTable is_same_line test faild"
+    assert not table.is_same_line(row, hash(LOCKING_STATE_STR2)), "LockTable is_same_line test faild"
+    table.append(row, shot2, hash(LOCKING_STATE_STR2))
+
+    # the view works as a Lock with the same shots
+    lock = dlm.Lock(None)
+    lock.append(shot1)
+    lock.append(shot2)
+    view = table[shot1.name]
+    assert view.name == shot1.name and view.inode_num == 5, "LockView test faild"
+    assert view.has_delta() and view.is_changed(), "LockView test faild"
+    assert view.get_key_index() == lock.get_key_index(), "LockView test faild"
+    for level in (dlm.LOCK_LEVEL_PR, dlm.LOCK_LEVEL_EX):
+        assert view.get_lock_level_info(level) == lock.get_lock_level_info(level), \
+            "LockView test faild"
+        # the info is computed once when the shot is appended
+        assert view.get_lock_level_info(level) == view.compute_lock_level_info(level), \
+            "LockTable info cache test faild"
+    assert table.key_index[row] == lock.get_key_index(), "LockTable info cache test faild"
+    # the sample keeps the info of the row when the next shot is appended
+    sample = dlm.LockSample(table, row)
+    table.append_unchanged(row)
+    assert sample.name == shot1.name and sample.get_key_index() == lock.get_key_index(), \
+        "LockSample test faild"
+    assert sample.get_lock_level_info(dlm.LOCK_LEVEL_EX) == \
+        lock.get_lock_level_info(dlm.LOCK_LEVEL_EX), "LockSample test faild"
+    assert not table.is_changed(row) and view.get_key_index() == 0, \
+        "LockTable append_unchanged test faild"
+
+    # the counters went backwards, the lockres was recreated, the shot is the first one again
+    table.begin_sample(1)
+    table.append(row, shot1)
+    assert table.resets == 1 and not table.has_delta(row), "LockTable reset test faild"
+    assert view.get_key_index() == 0, "LockTable reset test faild"
+    table.append(row, shot2)
+    assert view.get_lock_level_info(dlm.LOCK_LEVEL_EX) == (100, 20, 5), \
+        "LockTable reset test faild"
+    table.begin_sample(2)
+    assert table.resets == 0, "LockTable reset test faild"
+
+    # the row of a disappeared lockres is reused
+    table.remove(row)
+    assert len(table) == 0 and table.get(shot1.name) is None, "LockTable remove test faild"
+    assert table.add(dlm.LockName("N00000000000000050000c602")) == row, \
+        "LockTable free-list test faild"
+
+    # the coldest rows are the ones acquired the longest time ago
+    table.begin_sample(10)
+    hot = table.add(dlm.LockName("M000000000000000000000561bea620"))
+    table.last_active[row] = 5
+    assert table.coldest(1) == [row], "LockTable coldest test faild"
+    assert sorted(table.coldest(5)) == sorted([row, hot]), "LockTable coldest test faild"
+
+def test_lock_table_window():
+    """
+    Test the delta over a window of the samples in LockTable
+    """
+    table = dlm.LockTable(None, history=4, window=2)
+    tokens = LOCKING_STATE_STR1.split()
+    row = None
+    for second in range(6):
+        table.begin_sample(100 + second)
+        # 10 acquisitions and 1000ns per second
+        tokens[74] = str(10 * second)
+        tokens[78] = str(1000 * second)
+        shot = dlm.Shot("\t".join(tokens))
+        if row is None:
+            row = table.add(shot.name)
+        table.append(row, shot)
+        if second == 0:
+            assert not table.has_delta(row), "LockTable window test faild"
+    view = table[shot.name]
+    # the window holds the samples of the last 2 seconds
+    assert view.get_lock_level_info(dlm.LOCK_LEVEL_PR) == (2000, 20, 100), \
+        "LockTable window test faild"
+    # a row that missed a sample restarts its history
+    table.begin_sample(106)
+    table.begin_sample(107)
+    table.append(row, shot)
+    assert not table.has_delta(row), "LockTable window test faild"
+
+class FakeLockSet(object):
+    """
+    A lock set with a fixed key index, for the ranking tests
+    """
+    def __init__(self, inode_num, key_index):
+        self.inode_num = inode_num
+        self.key_index = key_index
+
+    def get_key_index(self):
+        return self.key_index
+
+def test_lock_set_group_ranking():
+    """
+    Test the bounded ranking of LockSetGroup
+    """
+    class FakeLockSpace(object):
+        _debug = False
+    lsg = dlm.LockSetGroup(10, FakeLockSpace(), 3)
+    user = [FakeLockSet(100 + i, i) for i in range(10)]
+    system = [FakeLockSet(5, 100), FakeLockSet(6, 200)]
+    tie = FakeLockSet(200, 9)
+    for lock_set in system + user + [tie]:
+        lsg.append(lock_set)
+    # the system inodes do not push the user inodes out, the first one wins a tie
+    assert lsg.get_top_n_key_index(5) == [user[9], tie, user[8]], \
+        "LockSetGroup ranking test faild"
+    assert lsg.get_top_n_key_index(2, debug=True) == [system[1], system[0]], \
+        "LockSetGroup ranking test faild"
+    assert len(lsg.lock_set_list) == 5, "LockSetGroup ranking test faild"
+
 def test_class_lock():
     """
     Test the Lock class in dlm.py
@@ -181,24 +365,26 @@ def test_class_lock_2():
     lock.append(shot2)
     shot = lock._shots[-1]
     # 34      22      0       0           21278   15984   36      15      1       22484   22484
-    assert shot.lock_num_prmode == '34'
-    assert shot.lock_num_exmode == '22'
-    assert shot.lock_num_prmode_failed == '0'
-    assert shot.lock_num_exmode_failed == '0'
-    assert shot.lock_total_prmode == '21278'
-    assert shot.lock_total_exmode == '15984'
-    assert shot.lock_max_exmode == '15'
-    assert shot.lock_refresh == '1'
+    assert shot.lock_num_prmode == 34
+    assert shot.lock_num_exmode == 22
+    assert shot.lock_total_prmode == 21278
+    assert shot.lock_total_exmode == 15984
+    # the other counters are extracted only by the full parser
+    shot = dlm.Shot(LOCKING_STATE_STR2, raw=True)
+    assert shot.lock_num_prmode_failed == 0
+    assert shot.lock_num_exmode_failed == 0
+    assert shot.lock_max_exmode == 15
+    assert shot.lock_refresh == 1
     total_time_field, total_num_field = lock._lock_level_2_field(dlm.LOCK_LEVEL_EX)
     assert total_time_field == 'lock_total_exmode'
     assert total_num_field == 'lock_num_exmode'
-    assert lock._get_data_field_indexed(total_time_field, -1) == "15984"
-    assert lock._get_data_field_indexed(total_num_field, -1) == "22"
+    assert lock._get_data_field_indexed(total_time_field, -1) == 15984
+    assert lock._get_data_field_indexed(total_num_field, -1) == 22
     total_time_field, total_num_field = lock._lock_level_2_field(dlm.LOCK_LEVEL_PR)
     assert total_time_field == 'lock_total_prmode'
     assert total_num_field == 'lock_num_prmode'
-    assert lock._get_data_field_indexed(total_time_field, -1) == "21278"
-    assert lock._get_data_field_indexed(total_num_field, -1) == "34"
+    assert lock._get_data_field_indexed(total_time_field, -1) == 21278
+    assert lock._get_data_field_indexed(total_num_field, -1) == 34
     #lock._get_latest_data_field_delta(total_time_field)
     assert lock.name == shot2.name
     assert node is lock.node
@@ -223,15 +409,33 @@ def test_class_lock_2():
 
 
     # test for _get_data_field_indexed in class Lock
-    assert lock._get_data_field_indexed('lock_num_prmode', -2) == '34'
-    assert lock._get_data_field_indexed('lock_total_exmode', -2) == '15984'
-    assert lock._get_data_field_indexed('lock_total_exmode', -1) == '15884'
+    assert lock._get_data_field_indexed('lock_num_prmode', -2) == 34
+    assert lock._get_data_field_indexed('lock_total_exmode', -2) == 15984
+    assert lock._get_data_field_indexed('lock_total_exmode', -1) == 15884
     assert lock._get_data_field_indexed('lock_total_exmode_suse', -1) == None
     assert lock._get_data_field_indexed('lock_total_exmode_suse', -2) == None
     assert lock._get_data_field_indexed('lock_total_exmode_suse', 100) == None
 
-    # test get_key_index in class Lock
-    assert lock.get_key_index() == 4412, "test get_key_index in class Lock failed"
+    # test get_key_index in class Lock, the counters went backwards, they were reset
+    assert lock.get_key_index() == 0, "test get_key_index in class Lock failed"
+
+def test_class_lock_append_unchanged():
+    """
+    Test the append_unchanged method of Lock, it is used by the delta collector
+    """
+    lock = dlm.Lock(None)
+    lock.append_unchanged()
+    assert not lock.has_delta(), "test append_unchanged in class Lock failed"
+    shot1 = dlm.Shot(LOCKING_STATE_STR1)
+    shot2 = dlm.Shot(LOCKING_STATE_STR2)
+    lock.append(shot1)
+    lock.append(shot2)
+    assert lock.get_lock_level_info(dlm.LOCK_LEVEL_EX) == (100, 20, 5)
+    lock.append_unchanged()
+    assert lock.has_delta(), "test append_unchanged in class Lock failed"
+    assert lock.get_lock_level_info(dlm.LOCK_LEVEL_EX) == (0, 0, 0),\
+    "test append_unchanged in class Lock failed"
+    assert lock.get_key_index() == 0, "test append_unchanged in class Lock failed"
 
 @pytest.fixture
 def data():
@@ -390,7 +594,7 @@ class TestLockSetGroup():
         assert lsg._max_sys_inode_num == 10, "LockSetGroup __init__ function test error"
         assert lsg.lock_space == lockspace, "LockSetGroup __init__ function test error"
         assert lsg._debug == lockspace._debug, "LockSetGroup __init__ function test error"
-        assert not lsg._sort_flag, "LockSetGroup __init__ function test error"
+        assert not lsg.get_top_n_key_index(10), "LockSetGroup __init__ function test error"
         assert lsg._max_length == 100, "LockSetGroup __init__ function test error"
 
     def test_LockSetGroup_append(self, complete_lockset):
@@ -524,20 +728,13 @@ class TestNode():
         shot = dlm.Shot(data[0])
         assert node["node"]._locks[shot.name] != None,\
         "Node process_one_shot method test error"
-        assert len(node["node"]._lock_space._lock_names) == 1,\
-        "Node process_one_shot method test error"
-        assert len(node["node"]._lock_space._lock_types) == 0,\
+        assert len(node["node"]._sample_types) == 0,\
         "Node process_one_shot method test error"
         node["node"].process_one_shot(data[0])
         assert len(node["node"]._locks) == 1,\
         "Node process_one_shot method test error"
-        assert len(node["node"]._lock_space._lock_names) == len(config.nodelist),\
-        "Node process_one_shot method test error"
-        assert len(node["node"]._lock_space._lock_types) == 0,\
+        assert len(node["node"]._sample_types) == 0,\
         "Node process_one_shot method test error"
-        node["node"]._lock_space.reduce_lock_name()
-        assert len(node["node"]._lock_space._lock_names) == 1,\
-        "LockSpace reduce_lock_name method test error"
 
     def test_contains(self, node, data):
         """
@@ -593,8 +790,6 @@ class TestLockSpace:
         "LockSpace __init__ method test error"
         assert not lockspace.should_stop,\
         "LockSpace __init__ method test error"
-        assert lockspace.first_run,\
-        "LockSpace __init__ method test error"
         assert len(lockspace._nodes) == len(config.nodelist),\
         "LockSpace __init__ method test error"
 
@@ -650,3 +845,215 @@ class TestLockSpace:
         lockset = lockspace.lock_name_to_lock_set(dlm.Shot(data[0]).name)
         assert lockset.name == dlm.Shot(data[0]).name
         assert len(lockset._lock_list) == len(config.nodelist)
+
+class FakeCat(object):
+    """
+    A collector that returns the given samples one by one
+    """
+    def __init__(self, samples):
+        self.samples = list(samples)
+
+    def get(self):
+        return self.samples.pop(0)
+
+@pytest.fixture
+def fake_lockspace(monkeypatch):
+    """
+    A lockspace of two nodes that does not need a cluster,
+    the samples are given to the nodes by the tests
+    """
+    monkeypatch.setattr(util, "lockspace_to_device", lambda uuid, ip_addr=None: (253, 16, "/mnt"))
+    return dlm.LockSpace(["node1", "node2"], "lockspace", 10, False)
+
+def test_node_failed_collection(fake_lockspace):
+    """
+    Test that a node whose collection fails or gets nothing is stale
+    """
+    node = fake_lockspace["node1"]
+    node._cat = FakeCat([[LOCKING_STATE_STR1], [LOCKING_STATE_STR2], []])
+    node.collect_once(1)
+    node.collect_once(2)
+    assert not node.stale and node.last_tick == 2 and len(node.active_locks) == 1,\
+        "Node collect_once test faild"
+    # the node is unreachable, the collector got nothing
+    node.collect_once(3)
+    assert node.stale and node.last_tick == 2, "Node failed collection test faild"
+    fake_lockspace.scheduler.tick = 3
+    assert fake_lockspace.stale_summary() == "stale: node1* (1s ago)",\
+        "Node failed collection test faild"
+    # the reply breaks midway
+    def broken_reply():
+        yield LOCKING_STATE_STR1
+        raise IOError("ssh channel to node1 is closed")
+    node._cat = FakeCat([broken_reply(), [LOCKING_STATE_STR2]])
+    node.collect_once(4)
+    assert node.stale_ticks == 2 and node.last_tick == 2, "Node failed collection test faild"
+    node.collect_once(5)
+    assert not node.stale and node.last_tick == 5, "Node failed collection test faild"
+
+def test_merge_nodes_not_sampled(fake_lockspace):
+    """
+    Test that a node that was not sampled again reports the lock types of its
+    last sample together with its active locks
+    """
+    node = fake_lockspace["node1"]
+    node._cat = FakeCat([[LOCKING_STATE_STR1], [LOCKING_STATE_STR2], []])
+    node.collect_once(1)
+    node.collect_once(2)
+    fake_lockspace.merge_nodes()
+    lock_types = fake_lockspace._lock_types
+    assert sum(lock_types.values()) == 1 and len(fake_lockspace._lock_names) == 1,\
+        "LockSpace merge_nodes test faild"
+    # the node got nothing, its last sample is reported again
+    node.collect_once(3)
+    fake_lockspace.merge_nodes()
+    assert fake_lockspace._lock_types == lock_types \
+        and len(fake_lockspace._lock_names) == 1, "LockSpace merge_nodes test faild"
+
+def lock_line(lock_name, acquired=0, wait=0):
+    """
+    Return a locking_state line of lock_name that was acquired acquired times
+    since LOCKING_STATE_STR1, wait is its lock_wait
+    """
+    fields = LOCKING_STATE_STR1.rstrip("\n").split("\t")
+    fields[1] = lock_name
+    # lock_num_prmode and lock_total_prmode
+    fields[74] = str(int(fields[74]) + acquired)
+    fields[78] = str(int(fields[78]) + acquired * 100)
+    fields[85] = str(wait)
+    return "\t".join(fields)
+
+def tracked(node):
+    """
+    Return the names of the lockres in the lock table of the node
+    """
+    return set(str(lock_name) for lock_name, _ in node._locks.rows())
+
+INODE_A = "M000000000000000000000561bea619"
+INODE_B = "M000000000000000000000561bea61a"
+INODE_C = "M000000000000000000000561bea61b"
+DENTRY_A = "N00000000000000050000c602"
+DENTRY_B = "N00000000000000050000c603"
+
+def test_process_all_slots_filtered(fake_lockspace, monkeypatch):
+    """
+    Test that the lines of the filtered lock types are not parsed,
+    only their changes are counted per type
+    """
+    node = fake_lockspace["node1"]
+    node.lock_types = set(["M"])
+    parsed = []
+    process_one_shot = node.process_one_shot
+    def spy(raw_string, lock_name=None):
+        parsed.append(raw_string.split("\t")[1])
+        return process_one_shot(raw_string, lock_name)
+    monkeypatch.setattr(node, "process_one_shot", spy)
+    node._cat = FakeCat([
+        [lock_line(INODE_A), lock_line(DENTRY_A)],
+        [lock_line(INODE_A, 1), lock_line(DENTRY_A, 1), lock_line(DENTRY_B)],
+        [lock_line(INODE_A, 1), lock_line(DENTRY_A, 1), lock_line(DENTRY_B)]])
+    node.collect_once(1)
+    assert tracked(node) == set([INODE_A]) and node.type_counts == {},\
+        "Node process_all_slots filter test faild"
+    # the new dentry lockres is not counted, it has no previous line
+    node.collect_once(2)
+    assert node.type_counts == {"M": 1, "N": 1}, "Node process_all_slots filter test faild"
+    node.collect_once(3)
+    assert node.type_counts == {}, "Node process_all_slots filter test faild"
+    assert set(parsed) == set([INODE_A]) and tracked(node) == set([INODE_A]),\
+        "Node process_all_slots filter test faild"
+    assert set(node._untracked) == set([DENTRY_A, DENTRY_B]),\
+        "Node process_all_slots filter test faild"
+
+def test_process_all_slots_filtered_delta(fake_lockspace):
+    """
+    Test that a delta keeps the fingerprints of the unchanged filtered lockres,
+    and a TOMBSTONE drops the fingerprint of the lockres that disappeared
+    """
+    node = fake_lockspace["node1"]
+    node.lock_types = set(["M"])
+    node._cat = FakeCat([
+        cat.DeltaSnapshot([lock_line(INODE_A), lock_line(DENTRY_A), lock_line(DENTRY_B)]),
+        cat.DeltaSnapshot([lock_line(DENTRY_A, 1)]),
+        cat.DeltaSnapshot([cat.TOMBSTONE + DENTRY_B]),
+        cat.DeltaSnapshot([lock_line(DENTRY_B, 1)])])
+    node.collect_once(1)
+    node.collect_once(2)
+    assert node.type_counts == {"N": 1} and set(node._untracked) == set([DENTRY_A, DENTRY_B]),\
+        "Node process_all_slots delta filter test faild"
+    node.collect_once(3)
+    assert node.type_counts == {} and set(node._untracked) == set([DENTRY_A]),\
+        "Node process_all_slots delta filter test faild"
+    # the lockres that appears again has no previous line, it is not counted
+    node.collect_once(4)
+    assert node.type_counts == {} and set(node._untracked) == set([DENTRY_A, DENTRY_B]),\
+        "Node process_all_slots delta filter test faild"
+    assert tracked(node) == set([INODE_A]), "Node process_all_slots delta filter test faild"
+
+WAITING = 1000000
+
+@pytest.mark.parametrize("delta", [False, True])
+def test_node_idle_ttl(fake_lockspace, monkeypatch, delta):
+    """
+    Test that the lockres idle for --idle-ttl are evicted except the waiting ones,
+    and an evicted lockres is tracked again when its line changes
+    """
+    monkeypatch.setattr(dlm.config, "IDLE_TTL", 2)
+    node = fake_lockspace["node1"]
+    if delta:
+        samples = [[lock_line(INODE_A), lock_line(INODE_B), lock_line(INODE_C, wait=WAITING)],
+                   [lock_line(INODE_A, 1)],
+                   [lock_line(INODE_A, 2)],
+                   [lock_line(INODE_B, 1)]]
+        samples = [cat.DeltaSnapshot(i) for i in samples]
+    else:
+        samples = [[lock_line(INODE_A), lock_line(INODE_B), lock_line(INODE_C, wait=WAITING)],
+                   [lock_line(INODE_A, 1), lock_line(INODE_B), lock_line(INODE_C, wait=WAITING)],
+                   [lock_line(INODE_A, 2), lock_line(INODE_B), lock_line(INODE_C, wait=WAITING)],
+                   [lock_line(INODE_A, 2), lock_line(INODE_B, 1),
+                    lock_line(INODE_C, wait=WAITING)]]
+    node._cat = FakeCat(samples)
+    node.collect_once(1)
+    node.collect_once(2)
+    assert tracked(node) == set([INODE_A, INODE_B, INODE_C]), "Node idle ttl test faild"
+    # INODE_B is idle since the tick 1, INODE_C is idle too but it is waiting
+    node.collect_once(5)
+    assert tracked(node) == set([INODE_A, INODE_C]) and node.evicted_idle == 1 \
+        and set(node._untracked) == set([INODE_B]), "Node idle ttl test faild"
+    node.collect_once(6)
+    assert tracked(node) == set([INODE_A, INODE_B, INODE_C]) and not node._untracked,\
+        "Node idle ttl test faild"
+
+@pytest.mark.parametrize("delta", [False, True])
+def test_node_max_locks(fake_lockspace, monkeypatch, delta):
+    """
+    Test that the least recently acquired lockres are evicted beyond --max-locks
+    except the waiting ones, and an evicted lockres is tracked again when its line changes
+    """
+    monkeypatch.setattr(dlm.config, "MAX_LOCKS", 2)
+    node = fake_lockspace["node1"]
+    if delta:
+        samples = [[lock_line(INODE_A), lock_line(INODE_B)],
+                   [lock_line(INODE_A, 1), lock_line(INODE_C, wait=WAITING)],
+                   [lock_line(INODE_A, 2)],
+                   [lock_line(INODE_B, 1)]]
+        samples = [cat.DeltaSnapshot(i) for i in samples]
+    else:
+        samples = [[lock_line(INODE_A), lock_line(INODE_B)],
+                   [lock_line(INODE_A, 1), lock_line(INODE_B), lock_line(INODE_C, wait=WAITING)],
+                   [lock_line(INODE_A, 2), lock_line(INODE_B), lock_line(INODE_C, wait=WAITING)],
+                   [lock_line(INODE_A, 2), lock_line(INODE_B, 1),
+                    lock_line(INODE_C, wait=WAITING)]]
+    node._cat = FakeCat(samples)
+    node.collect_once(1)
+    # INODE_B is the coldest one
+    node.collect_once(2)
+    assert tracked(node) == set([INODE_A, INODE_C]) and node.evicted_lru == 1,\
+        "Node max locks test faild"
+    node.collect_once(3)
+    assert tracked(node) == set([INODE_A, INODE_C]) and set(node._untracked) == set([INODE_B]),\
+        "Node max locks test faild"
+    # INODE_B is tracked again, INODE_A is the coldest one now, INODE_C is still waiting
+    node.collect_once(4)
+    assert tracked(node) == set([INODE_B, INODE_C]) and node.evicted_lru == 2 \
+        and set(node._untracked) == set([INODE_A]), "Node max locks test faild"
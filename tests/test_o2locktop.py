@@ -75,6 +75,24 @@ def test_parse_args():
            not args["display_len"]and \
            not args["debug"]
 
+def test_parse_args_compress(monkeypatch):
+    # parse_args sets the collector and the codec in config
+    monkeypatch.setattr(o2locktop.config, "COLLECTOR", o2locktop.config.COLLECTOR)
+    monkeypatch.setattr(o2locktop.config, "COMPRESS", o2locktop.config.COMPRESS)
+    with pytest.raises(SystemExit):
+        o2locktop.parse_args(['--collector', 'stream', '--compress', 'zlib', '/mnt/ocfs2'])
+    args = o2locktop.parse_args(['--collector', 'delta', '--compress', 'zlib', '/mnt/ocfs2'])
+    assert args["mode"] == 'local', "o2locktop parse_args compress test error"
+
+def test_filter_interval(monkeypatch):
+    monkeypatch.setattr(o2locktop.config, "ADAPTIVE", False)
+    monkeypatch.setattr(o2locktop.config, "INTERVAL", 5)
+    monkeypatch.setattr(o2locktop.config, "WINDOW", 0)
+    assert o2locktop._filter_interval() == 11, "o2locktop _filter_interval test error"
+    # the filter covers the window
+    monkeypatch.setattr(o2locktop.config, "WINDOW", 300)
+    assert o2locktop._filter_interval() == 300, "o2locktop _filter_interval test error"
+
 def test_parse_args_full_function(mount_point, node, lines, debug, log, version, wrong_arg):
     raw_args = mount_point + node + lines + debug + log + version + wrong_arg
     while '' in raw_args:
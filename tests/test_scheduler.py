@@ -0,0 +1,53 @@
+import sys
+sys.path.append("../")
+from o2locktoplib import scheduler
+
+
+class FakeClock(object):
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_next_tick():
+    sched = scheduler.Scheduler(5)
+    assert sched.next_tick(100) == 105, "Scheduler.next_tick test faild"
+    assert sched.next_tick(101.5) == 105, "Scheduler.next_tick test faild"
+    assert sched.next_tick(101.5, 1) == 102, "Scheduler.next_tick test faild"
+
+def test_delay():
+    clock = FakeClock(101.5)
+    sched = scheduler.Scheduler(5, clock)
+    tick, delay = sched.delay()
+    assert (tick, delay) == (101.5, 0), "the first tick of Scheduler should fire at once"
+    sched.begin(tick)
+    tick, delay = sched.delay()
+    assert (tick, delay) == (105, 3.5), "Scheduler.delay test faild"
+    sched.begin(tick)
+    assert sched.window == 3.5, "Scheduler.begin test faild"
+
+def test_end_skipped():
+    clock = FakeClock(100)
+    sched = scheduler.Scheduler(5, clock)
+    sched.begin(100)
+    clock.now = 103
+    assert sched.end() == 0, "Scheduler.end test faild"
+    clock.now = 111
+    assert sched.end() == 2, "Scheduler.end should skip the overrun ticks"
+    assert sched.skipped == 2, "Scheduler.end test faild"
+    tick, _ = sched.delay()
+    assert tick == 115, "Scheduler.delay test faild after the overrun"
+
+def test_adaptive_interval():
+    adaptive = scheduler.AdaptiveInterval(2, 9)
+    assert adaptive.interval == 2, "AdaptiveInterval test faild"
+    assert adaptive.update(0.01, 0) == 4, "a quiet node should be sampled less often"
+    assert adaptive.update(0.01, 0) == 8, "AdaptiveInterval test faild"
+    assert adaptive.update(0.01, 0) == 8, "the interval should not exceed the maximum"
+    assert adaptive.update(0.01, 0.5) == 4, "a busy node should be sampled more often"
+    assert adaptive.update(0.01, 0.5) == 2, "AdaptiveInterval test faild"
+    assert adaptive.update(0.01, 0.5) == 2, "the interval should not be under the minimum"
+    assert adaptive.update(0.5, 0.5) == 6, "the collection should not overload the node"
+    assert adaptive.update(0.5, 0.1) == 6, "AdaptiveInterval test faild"
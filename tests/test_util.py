@@ -126,3 +126,37 @@ def test_trans_uuid():
     util._trans_uuid("DAF3F5B6F1C04B15B9ED8FAAF109E895"),\
     "get_one_cat test faild"
     assert not util._trans_uuid(""), "get_one_cat test faild in None branch"
+
+def test_human_readable_size():
+    assert util.human_readable_size(100) == "100B", "human_readable_size test faild"
+    assert util.human_readable_size(1536) == "1.5K", "human_readable_size test faild"
+    assert util.human_readable_size(3*1024*1024) == "3.0M", "human_readable_size test faild"
+    assert util.human_readable_size(5*1024**4) == "5120.0G", "human_readable_size test faild"
+
+def test_shell_iter_output():
+    sh = shell.Shell(stream=True).run("printf 'a\\n\\nb\\n'")
+    lines = sh.iter_output()
+    assert not isinstance(lines, list), "Shell.iter_output should be a generator"
+    assert list(lines) == ['a', 'b'], "Shell.iter_output test faild"
+    assert sh.code == 0, "Shell.iter_output test faild"
+    sh = shell.Shell(stream=True).run("yes")
+    lines = sh.iter_output()
+    assert next(lines) == 'y', "Shell.iter_output test faild"
+    lines.close()
+    assert sh.code != 0, "Shell.iter_output should kill the command when stopped early"
+
+def test_ssh_prefix(monkeypatch):
+    assert util.ssh_prefix(None) == "", "ssh_prefix test faild"
+    monkeypatch.setattr(util, "_SSH_CONTROL_DIR", None)
+    assert util.ssh_prefix("node1") == "ssh root@node1 ", "ssh_prefix test faild"
+    assert util.ssh_prefix("node1", ["-oBatchMode=yes"], user="user") == \
+        "ssh -oBatchMode=yes user@node1 ", "ssh_prefix test faild"
+    monkeypatch.setattr(util, "_SSH_CONTROL_DIR", "/tmp/o2locktop-ssh-test")
+    assert util.ssh_prefix("node1") == "ssh -oControlMaster=no "\
+        "-oControlPath=/tmp/o2locktop-ssh-test/%C root@node1 ", \
+        "ssh_prefix should reuse the control connection"
+    # the path of the control socket is quoted for the shell
+    monkeypatch.setattr(util, "_SSH_CONTROL_DIR", "/tmp/o2locktop ssh")
+    assert util.ssh_prefix("node1") == "ssh -oControlMaster=no "\
+        "'-oControlPath=/tmp/o2locktop ssh/%C' root@node1 ", \
+        "ssh_prefix should quote the control path"